@@ -14,12 +14,13 @@ from channels.auth import AuthMiddlewareStack
 # Import AFTER setup
 from notifications.routing import websocket_urlpatterns as notifications_ws
 from patients.routing import websocket_urlpatterns as chat_ws
+from .lifespan import BackgroundServicesMiddleware
 
-application = ProtocolTypeRouter({
+application = BackgroundServicesMiddleware(ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
         URLRouter(notifications_ws + chat_ws)
     ),
-})
+}))
 
 #uvicorn HospitalManagmentSystem.asgi:application --reload
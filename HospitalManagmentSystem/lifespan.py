@@ -0,0 +1,62 @@
+import logging
+
+from appointments.reminders import reminder_scheduler
+from notifications.dispatcher import outbox_dispatcher
+from patients.chatbuffer import chat_write_buffer
+from users.blacklist import blacklist_filter
+
+logger = logging.getLogger(__name__)
+
+# Background services that live on the ASGI server's event loop.
+# Each one exposes start() (sync, called inside the loop) and async stop().
+BACKGROUND_SERVICES = [
+    outbox_dispatcher,
+    chat_write_buffer,
+    blacklist_filter,
+    reminder_scheduler,
+]
+
+
+class BackgroundServicesMiddleware:
+    """
+    Starts BACKGROUND_SERVICES on ASGI lifespan startup (uvicorn) and stops them
+    on shutdown. Servers without lifespan support (daphne) start them lazily on
+    the first HTTP or WebSocket connection instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        self.start_services()
+        await self.app(scope, receive, send)
+
+    def start_services(self):
+        for service in BACKGROUND_SERVICES:
+            service.start()
+
+    async def stop_services(self):
+        for service in BACKGROUND_SERVICES:
+            try:
+                await service.stop()
+            except Exception:
+                logger.exception("Error stopping %s", service)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.start_services()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.stop_services()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
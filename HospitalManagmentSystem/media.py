@@ -0,0 +1,143 @@
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import condition, require_safe
+
+MEDIA_SERVING_DEFAULTS = {
+    "CACHE_MAX_AGE": 30 * 24 * 60 * 60,  # seconds browsers may reuse a file without asking
+    "OFFLOAD_HEADER": None,              # None, "X-Accel-Redirect" (nginx) or "X-Sendfile" (Apache, lighttpd)
+    "OFFLOAD_PREFIX": "/protected-media/",  # internal nginx location mapped to MEDIA_ROOT
+    "CHUNK_SIZE": 64 * 1024,             # bytes per read when streaming a range
+}
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def media_setting(name):
+    return getattr(settings, "MEDIA_SERVING", {}).get(name, MEDIA_SERVING_DEFAULTS[name])
+
+
+def _media_stat(path):
+    """
+    os.stat of the file under MEDIA_ROOT, or None if it is missing or outside it.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        return None
+    return stat if os.path.isfile(full_path) else None
+
+
+def media_etag(request, path):
+    stat = _media_stat(path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}" if stat else None
+
+
+def media_last_modified(request, path):
+    stat = _media_stat(path)
+    return datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc) if stat else None
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive. Returns None when the
+    whole file should be sent and raises ValueError if the range cannot be
+    satisfied. Multi-range requests get the whole file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:  # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def _if_range_matches(request, etag, stat):
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        return if_range.strip() == f'"{etag}"'
+    return parse_http_date_safe(if_range) == int(stat.st_mtime)
+
+
+def _read_range(full_path, start, end):
+    chunk_size = media_setting("CHUNK_SIZE")
+    with open(full_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+# Media files (profile pictures and thumbnails)
+@require_safe
+@condition(etag_func=media_etag, last_modified_func=media_last_modified)
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with validators for 304s, single byte ranges
+    and long-lived cache headers. With OFFLOAD_HEADER set the front proxy
+    sends the file instead (and handles ranges itself).
+    """
+    stat = _media_stat(path)
+    if stat is None:
+        raise Http404("File not found")
+
+    full_path = safe_join(settings.MEDIA_ROOT, path)
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    offload_header = media_setting("OFFLOAD_HEADER")
+
+    if offload_header:
+        response = HttpResponse(content_type=content_type)
+        if offload_header == "X-Accel-Redirect":
+            response[offload_header] = media_setting("OFFLOAD_PREFIX").rstrip("/") + "/" + path.lstrip("/")
+        else:
+            response[offload_header] = full_path
+    else:
+        byte_range = None
+        range_header = request.headers.get("Range")
+        if range_header and _if_range_matches(request, media_etag(request, path), stat):
+            try:
+                byte_range = parse_range(range_header, stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{stat.st_size}"
+                return response
+
+        if byte_range is None:
+            # FileResponse lets the server use sendfile() via wsgi.file_wrapper
+            response = FileResponse(open(full_path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(full_path, start, end), status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+        response["Accept-Ranges"] = "bytes"
+
+    response["Cache-Control"] = f"public, max-age={media_setting('CACHE_MAX_AGE')}"
+    response["Expires"] = http_date(datetime.now(tz=timezone.utc).timestamp() + media_setting("CACHE_MAX_AGE"))
+    return response
@@ -33,6 +33,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Paginated list endpoints return the next page's cursor in this header
+CORS_EXPOSE_HEADERS = ["X-Next-Cursor"]
 
 # Application definition
 
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'ninja',
     'ninja_jwt',
+    'ninja_jwt.token_blacklist',
     'users',
     'appointments',
     'patients',
@@ -109,6 +112,65 @@ CHANNEL_LAYERS = {
 }
 '''
 # In Production: Change "InMemoryChannelLayer" to "channels_redis.core.RedisChannelLayer" and configure Redis properly. 
+# Several ASGI workers on one host without Redis: share the layer through SQLite
+# (benchmark with `python manage.py benchmark_channel_layer`)
+'''
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "notifications.layers.SQLiteChannelLayer",
+        "CONFIG": {
+            "path": BASE_DIR / "channels.sqlite3",
+        },
+    },
+}
+'''
+
+# Notification outbox: WebSocket pushes are written next to the Notification row
+# and delivered after commit by notifications.dispatcher (started in asgi.py)
+NOTIFICATION_OUTBOX = {
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF_BASE": 0.5,  # seconds, doubled on every failed attempt
+    "BACKOFF_MAX": 60,
+    "POLL_INTERVAL": 5,
+    "LEASE": 30,
+}
+
+# Unread notifications replayed to a client reconnecting with ?last_seen_id=
+# (all of them, PAGE_SIZE rows per query)
+NOTIFICATION_REPLAY = {
+    "CHUNK_SIZE": 50,
+    "PAGE_SIZE": 500,
+}
+
+# Seconds during which repeated real-time notifications from one source to one
+# recipient collapse into a single message with a count (notifications.coalesce)
+NOTIFICATION_COALESCE_WINDOWS = {
+    "default": 0,
+    "chat": 3,
+}
+
+# Server-Sent Events fallback at /api/notifications/stream
+NOTIFICATION_SSE = {
+    "HEARTBEAT": 15,  # seconds
+    "RETRY": 5000,  # milliseconds
+}
+
+# Per-connection outbound queue of the WebSocket consumers (notifications.sendqueue).
+# OVERFLOW_POLICY: "drop_oldest" notification, "coalesce" queued notifications,
+# or "disconnect" with a resume hint. Daphne does not block sends on a slow client,
+# so there the queue only bounds the event loop's backlog (see BoundedSendMixin).
+WEBSOCKET_SEND_QUEUE = {
+    "MAX_SIZE": 100,
+    "OVERFLOW_POLICY": "drop_oldest",
+}
+
+# Chat messages are broadcast immediately and stored in batches (patients.chatbuffer)
+CHAT_WRITE_BUFFER = {
+    "FLUSH_INTERVAL_MS": 200,
+    "MAX_MESSAGES": 100,
+    "MAX_RETRIES": 5,  # failed flushes before a message is dropped
+}
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -157,6 +219,15 @@ USE_TZ = True
 import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Media view (HospitalManagmentSystem.media). Behind nginx, set OFFLOAD_HEADER to
+# "X-Accel-Redirect" with an internal location at OFFLOAD_PREFIX aliased to MEDIA_ROOT.
+MEDIA_SERVING = {
+    "CACHE_MAX_AGE": 30 * 24 * 60 * 60,  # seconds
+    "OFFLOAD_HEADER": None,
+    "OFFLOAD_PREFIX": "/protected-media/",
+}
+
 STATIC_URL = 'static/'
 
 # Default primary key field type
@@ -169,4 +240,51 @@ NINJA_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
+# Process-local cache of verified access tokens and their users (users.tokencache)
+AUTH_TOKEN_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": 60,  # seconds
+}
+# In-memory filter of blacklisted refresh tokens in front of the blacklist tables (users.blacklist)
+TOKEN_BLACKLIST_FILTER = {
+    "CAPACITY": 100000,
+    "ERROR_RATE": 0.01,
+    "SYNC_INTERVAL": 5,  # seconds
+    "REBUILD_INTERVAL": 3600,  # seconds
+    "SYNC_OVERLAP": 60,  # seconds
+    "MAX_STALENESS": 20,  # seconds
+}
+# Dedicated thread pool for password hashing during login (users.hashing)
+PASSWORD_HASHING = {
+    "MAX_WORKERS": 4,
+    "MAX_PENDING": 32,  # beyond this, logins get a 503 instead of queueing
+}
+# Profile pictures are stored under their SHA-256; thumbnails are generated in the background (users.media)
+PROFILE_PICTURES = {
+    "THUMBNAIL_SIZE": (128, 128),
+    "THUMBNAIL_QUALITY": 85,
+    "THUMBNAIL_WORKERS": 2,
+}
+# Upload limits of the import-patients endpoint (users.importer); larger
+# registries go through `manage.py import_patients`
+PATIENT_IMPORT = {
+    "MAX_UPLOAD_BYTES": 1024 * 1024,
+    "MAX_UPLOAD_ROWS": 200,  # rows after the offset
+}
+# Reminders for confirmed appointments, sent by a timer heap on the ASGI event
+# loop (appointments.reminders) this many minutes before each appointment
+APPOINTMENT_REMINDERS = {
+    "LEAD_MINUTES": [24 * 60, 60],
+    "RETRY_DELAY": 60,  # seconds
+}
+# Duplicate patient detection (patients.duplicates, find_duplicate_patients command).
+# Pairs sharing a phonetic surname and birth year or kebele are scored on name,
+# birth date and phone agreement; the weights sum to 1.
+DUPLICATE_DETECTION = {
+    "THRESHOLD": 0.8,
+    "MAX_BLOCK_SIZE": 1000,
+    "NAME_WEIGHT": 0.6,
+    "BIRTH_DATE_WEIGHT": 0.25,
+    "PHONE_WEIGHT": 0.15,
+}
 APPEND_SLASH=False
\ No newline at end of file
@@ -15,17 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+import re
+from django.urls import path, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from .api import api  # Importing the API urls
+from .media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/", api.urls),
+    # Serve media files (profile pictures, etc.), also in production
+    re_path(r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")), serve_media),
 ]
 
-# Serve media files (profile pictures, etc.) during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
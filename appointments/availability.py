@@ -0,0 +1,114 @@
+import bisect
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from .models import Appointment, BlockedPeriod, DoctorAvailability
+
+
+def _local(value):
+    # Blocked periods are stored aware; slots are naive local date + time
+    return timezone.localtime(value).replace(tzinfo=None)
+
+
+class DoctorSchedule:
+    """
+    One doctor's working hours, blocked periods and bookings between two
+    dates (inclusive), indexed for slot lookups: working hours by weekday,
+    blocked periods merged into disjoint intervals searched with bisect and
+    booked slots in a set.
+
+    A doctor with no working hours configured can be booked at any time that
+    is not blocked.
+    """
+
+    def __init__(self, doctor_id, start_date, end_date):
+        self.windows = defaultdict(list)  # weekday -> [(start_time, end_time, slot_minutes)]
+        for weekday, start, end, slot_minutes in (
+            DoctorAvailability.objects.filter(doctor_id=doctor_id)
+            .order_by("weekday", "start_time")
+            .values_list("weekday", "start_time", "end_time", "slot_minutes")
+        ):
+            self.windows[weekday].append((start, end, slot_minutes))
+
+        range_start = timezone.make_aware(datetime.combine(start_date, time.min))
+        range_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+        self._starts, self._ends = [], []
+        for start, end in (
+            BlockedPeriod.objects.filter(doctor_id=doctor_id, start__lt=range_end, end__gt=range_start)
+            .order_by("start")
+            .values_list("start", "end")
+        ):
+            start, end = _local(start), _local(end)
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+        self.booked = set(
+            Appointment.objects.filter(doctor_id=doctor_id, date__range=(start_date, end_date))
+            .exclude(status="canceled")
+            .values_list("date", "time")
+        )
+
+    @property
+    def has_working_hours(self):
+        return bool(self.windows)
+
+    def is_blocked(self, start, end):
+        """
+        Whether [start, end) overlaps a blocked period (a zero-length range
+        checks a single instant).
+        """
+        i = bisect.bisect_right(self._starts, start) - 1
+        if i >= 0 and self._ends[i] > start:
+            return True
+        return i + 1 < len(self._starts) and self._starts[i + 1] < end
+
+    def _window_slot(self, day, at):
+        """
+        Length in minutes of the working-hours slot starting at `at` on `day`,
+        or None if no slot starts then.
+        """
+        start = datetime.combine(day, at)
+        for window_start, window_end, slot_minutes in self.windows.get(day.weekday(), []):
+            offset = start - datetime.combine(day, window_start)
+            length = timedelta(minutes=slot_minutes)
+            if offset >= timedelta(0) and offset % length == timedelta(0) and start + length <= datetime.combine(day, window_end):
+                return slot_minutes
+        return None
+
+    def free_slots(self, day, after=None):
+        """
+        Start times of the open slots on `day`, optionally only those after a
+        naive local datetime.
+        """
+        slots = []
+        for window_start, window_end, slot_minutes in self.windows.get(day.weekday(), []):
+            length = timedelta(minutes=slot_minutes)
+            start, end = datetime.combine(day, window_start), datetime.combine(day, window_end)
+            while start + length <= end:
+                if (after is None or start > after) and (day, start.time()) not in self.booked \
+                        and not self.is_blocked(start, start + length):
+                    slots.append(start.time())
+                start += length
+        return sorted(set(slots))
+
+    def booking_error(self, day, at):
+        """
+        Why `at` on `day` is outside the doctor's hours or blocked, or None.
+        Whether the slot is taken is left to the unique_doctor_slot
+        constraint, which also catches concurrent bookings.
+        """
+        start = datetime.combine(day, at)
+        if self.has_working_hours:
+            slot_minutes = self._window_slot(day, at)
+            if slot_minutes is None:
+                return "The doctor has no slot starting at that time"
+            end = start + timedelta(minutes=slot_minutes)
+        else:
+            end = start
+        if self.is_blocked(start, end):
+            return "The doctor is unavailable at that time"
+        return None
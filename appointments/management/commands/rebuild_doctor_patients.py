@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from appointments.relations import rebuild_relations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the doctor-patient relation table (visit counts, first/last seen) from the appointments."
+
+    def handle(self, *args, **options):
+        total = rebuild_relations()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} doctor-patient relations"))
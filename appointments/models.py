@@ -18,5 +18,98 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One live booking per doctor and slot, however many requests race for it
+            models.UniqueConstraint(
+                fields=["doctor", "date", "time"],
+                condition=~models.Q(status="canceled"),
+                name="unique_doctor_slot",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["doctor", "date", "time"]),
+            models.Index(fields=["patient", "date"]),
+            models.Index(fields=["status", "date", "time"]),  # Reminder scheduler rebuild
+        ]
+
     def __str__(self):
         return f"Appointment between {self.patient.username} and {self.doctor.username} on {self.date} at {self.time}"
+
+# Reminders already sent, one per appointment and lead time. Lets several
+# worker processes and restarts share appointments.reminders without
+# sending twice; cleared when an appointment is rescheduled.
+class AppointmentReminder(models.Model):
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='reminders')
+    lead_minutes = models.PositiveIntegerField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["appointment", "lead_minutes"], name="unique_appointment_reminder"),
+        ]
+
+    def __str__(self):
+        return f"Reminder for appointment {self.appointment_id}, {self.lead_minutes} minutes ahead"
+
+# Which patients each doctor has seen, maintained from appointments by
+# appointments.relations so patient lists do not scan the appointments table
+class DoctorPatient(models.Model):
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='doctor_patients')
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='patient_doctors')
+    first_seen = models.DateField()  # Earliest appointment date
+    last_seen = models.DateField()   # Latest appointment date
+    visit_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["doctor", "patient"], name="unique_doctor_patient"),
+        ]
+        indexes = [
+            models.Index(fields=["patient"]),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.username} - {self.patient.username} ({self.visit_count} visits)"
+
+# Weekly working hours of a doctor, split into bookable slots. A doctor can
+# have several windows on the same weekday (e.g. morning and afternoon).
+class DoctorAvailability(models.Model):
+    WEEKDAYS = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availability', limit_choices_to={'role': 'doctor'})
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "weekday"]),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.username}: {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+# Time a doctor cannot be booked (leave, surgery, training)
+class BlockedPeriod(models.Model):
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocked_periods', limit_choices_to={'role': 'doctor'})
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    reason = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "start"]),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.username} unavailable {self.start} - {self.end}"
@@ -0,0 +1,59 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Greatest, Least
+from .models import Appointment, DoctorPatient
+
+VISIT_AGGREGATES = {
+    "visit_count": models.Count("id"),
+    "first_seen": models.Min("date"),
+    "last_seen": models.Max("date"),
+}
+
+
+def add_visit(doctor_id, patient_id, date):
+    """
+    Count a new appointment in the doctor-patient relation.
+    """
+    updated = DoctorPatient.objects.filter(doctor_id=doctor_id, patient_id=patient_id).update(
+        visit_count=models.F("visit_count") + 1,
+        first_seen=Least("first_seen", models.Value(date)),
+        last_seen=Greatest("last_seen", models.Value(date)),
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            DoctorPatient.objects.create(
+                doctor_id=doctor_id, patient_id=patient_id, first_seen=date, last_seen=date, visit_count=1
+            )
+    except IntegrityError:
+        # A concurrent booking created the row first
+        add_visit(doctor_id, patient_id, date)
+
+
+def refresh_visits(doctor_id, patient_id):
+    """
+    Recompute the relation from the pair's appointments after one was
+    deleted or rescheduled; drop it when none are left.
+    """
+    with transaction.atomic():
+        totals = Appointment.objects.filter(doctor_id=doctor_id, patient_id=patient_id).aggregate(**VISIT_AGGREGATES)
+        relation = DoctorPatient.objects.filter(doctor_id=doctor_id, patient_id=patient_id)
+        if not totals["visit_count"]:
+            relation.delete()
+        elif not relation.update(**totals):
+            DoctorPatient.objects.create(doctor_id=doctor_id, patient_id=patient_id, **totals)
+
+
+def rebuild_relations():
+    """
+    Rebuild the whole table from the appointments. Returns the number of pairs.
+    """
+    pairs = (
+        Appointment.objects.values("doctor_id", "patient_id")
+        .annotate(**VISIT_AGGREGATES)
+        .order_by()
+    )
+    with transaction.atomic():
+        DoctorPatient.objects.all().delete()
+        created = DoctorPatient.objects.bulk_create((DoctorPatient(**pair) for pair in pairs.iterator()), batch_size=2000)
+    return len(created)
@@ -0,0 +1,262 @@
+import asyncio
+import heapq
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from notifications.utils import send_notification_to_users
+from .models import Appointment, AppointmentReminder
+
+logger = logging.getLogger(__name__)
+
+APPOINTMENT_REMINDER_DEFAULTS = {
+    "LEAD_MINUTES": [24 * 60, 60],  # reminders sent this long before each confirmed appointment
+    "RETRY_DELAY": 60,              # seconds before reminders that failed to send are tried again
+    "MAX_SLEEP": 300,               # longest the timer sleeps without re-reading the clock
+}
+
+
+def reminder_setting(name):
+    return getattr(settings, "APPOINTMENT_REMINDERS", {}).get(name, APPOINTMENT_REMINDER_DEFAULTS[name])
+
+
+def appointment_start(date, at):
+    """
+    Aware start of an appointment (date and time are local to TIME_ZONE).
+    """
+    return timezone.make_aware(datetime.combine(date, at))
+
+
+def reminder_times(start, current):
+    """
+    (fire timestamp, lead minutes) of the reminders still to send for an
+    appointment starting at `start`. If some lead times have already passed
+    and the appointment has not started, the shortest of them fires now:
+    this covers late confirmations and reminders missed while the server
+    was down (those already sent are skipped by AppointmentReminder).
+    """
+    start_ts = start.timestamp()
+    entries, overdue = [], None
+    for lead in sorted(reminder_setting("LEAD_MINUTES"), reverse=True):
+        fire_at = start_ts - lead * 60
+        if fire_at > current:
+            entries.append((fire_at, lead))
+        else:
+            overdue = lead
+    if overdue is not None and start_ts > current:
+        entries.append((current, overdue))
+    return entries
+
+
+def upcoming_appointments():
+    """
+    (id, start) of every confirmed appointment from today on; one range scan
+    of the (status, date, time) index.
+    """
+    today = timezone.localdate()
+    rows = (
+        Appointment.objects.filter(status="confirmed", date__gte=today)
+        .values_list("id", "date", "time")
+        .iterator(chunk_size=5000)
+    )
+    return [(appointment_id, appointment_start(date, at)) for appointment_id, date, at in rows]
+
+
+def send_reminders(due):
+    """
+    Send the due (appointment id, lead minutes, start) reminders whose
+    appointment is still confirmed for that start. Returns the number sent.
+    """
+    appointments = {
+        a["id"]: a
+        for a in Appointment.objects.filter(id__in={d[0] for d in due}, status="confirmed").values(
+            "id", "date", "time", "patient_id", doctor_username=models.F("doctor__username"),
+        )
+    }
+    current, sent = timezone.now(), 0
+    for appointment_id, lead, start in due:
+        a = appointments.get(appointment_id)
+        if a is None or appointment_start(a["date"], a["time"]) != start or start <= current:
+            continue  # Canceled, rescheduled or already started since it was scheduled
+        try:
+            with transaction.atomic():
+                AppointmentReminder.objects.create(appointment_id=appointment_id, lead_minutes=lead)
+                send_notification_to_users(
+                    [a["patient_id"]],
+                    f"Reminder: you have an appointment with {a['doctor_username']} "
+                    f"on {a['date']} at {a['time'].strftime('%H:%M')}.",
+                )
+        except IntegrityError:
+            continue  # Sent by another worker or before a restart
+        sent += 1
+    return sent
+
+
+class ReminderScheduler:
+    """
+    Min-heap of upcoming reminders on the ASGI event loop. Built on startup
+    from one query over the confirmed appointments, then kept current by
+    update_appointment/delete_appointment through appointment_changed() and
+    appointment_deleted(); there is no periodic scan.
+
+    Heap entries carry the appointment start they were computed from. An
+    entry whose appointment has since moved or been canceled is discarded
+    when popped, and each reminder is checked against the database once
+    more before it is sent.
+    """
+
+    def __init__(self):
+        self._heap = []        # (fire timestamp, appointment id, lead minutes, start)
+        self._starts = {}      # appointment id -> start its live entries belong to
+        self._remaining = {}   # appointment id -> live entries left in the heap
+        self._stale = 0
+        self._updates = None   # Buffered while the heap is being rebuilt
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+
+    def start(self):
+        """
+        Start the timer loop on the running event loop (no-op if already running).
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+        self._loop = None
+
+    def reschedule(self, appointment_id, start):
+        """
+        Replace the appointment's reminders with those for `start` (None
+        cancels them). Safe to call from any thread; a no-op when the
+        scheduler is not running in this process.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._apply, appointment_id, start)
+
+    def _apply(self, appointment_id, start):
+        if self._updates is not None:
+            self._updates.append((appointment_id, start))
+            return
+        self._stale += self._remaining.pop(appointment_id, 0)
+        self._starts.pop(appointment_id, None)
+        if start is not None:
+            self._push(appointment_id, start, time.time())
+        if self._stale > max(1000, len(self._heap) // 2):
+            self._compact()
+        self._wakeup.set()
+
+    def _push(self, appointment_id, start, current):
+        entries = reminder_times(start, current)
+        if not entries:
+            return
+        self._starts[appointment_id] = start
+        self._remaining[appointment_id] = self._remaining.get(appointment_id, 0) + len(entries)
+        for fire_at, lead in entries:
+            heapq.heappush(self._heap, (fire_at, appointment_id, lead, start))
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._starts.get(entry[1]) == entry[3]]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    async def rebuild(self):
+        """
+        Reload the heap from the database, keeping changes made meanwhile.
+        """
+        self._updates = []
+        try:
+            appointments = await sync_to_async(upcoming_appointments)()
+        except Exception:
+            updates, self._updates = self._updates, None
+            for update in updates:
+                self._apply(*update)
+            raise
+
+        self._heap, self._starts, self._remaining, self._stale = [], {}, {}, 0
+        current = time.time()
+        for appointment_id, start in appointments:
+            self._push(appointment_id, start, current)
+        updates, self._updates = self._updates, None
+        for update in updates:
+            self._apply(*update)
+
+    def _pop_due(self, current):
+        due = []
+        while self._heap and self._heap[0][0] <= current:
+            fire_at, appointment_id, lead, start = heapq.heappop(self._heap)
+            if self._starts.get(appointment_id) != start:
+                self._stale -= 1
+                continue
+            due.append((appointment_id, lead, start))
+            self._remaining[appointment_id] -= 1
+            if not self._remaining[appointment_id]:
+                del self._remaining[appointment_id], self._starts[appointment_id]
+        return due
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild()
+                break
+            except Exception:
+                logger.exception("Could not load appointment reminders, retrying")
+                await asyncio.sleep(reminder_setting("RETRY_DELAY"))
+
+        while True:
+            self._wakeup.clear()
+            due = self._pop_due(time.time())
+            if due:
+                try:
+                    await sync_to_async(send_reminders)(due)
+                except Exception:
+                    logger.exception("Sending %s appointment reminders failed, retrying", len(due))
+                    retry_at = time.time() + reminder_setting("RETRY_DELAY")
+                    for appointment_id, lead, start in due:
+                        if appointment_id not in self._starts:
+                            self._starts[appointment_id] = start
+                        if self._starts[appointment_id] == start:
+                            self._remaining[appointment_id] = self._remaining.get(appointment_id, 0) + 1
+                            heapq.heappush(self._heap, (retry_at, appointment_id, lead, start))
+
+            timeout = reminder_setting("MAX_SLEEP")
+            if self._heap:
+                timeout = max(0, min(self._heap[0][0] - time.time(), timeout))
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+
+
+reminder_scheduler = ReminderScheduler()
+
+
+def appointment_changed(appointment, rescheduled=False):
+    """
+    Call in the transaction that saved the appointment: a new date or time
+    clears the reminders already sent, and after commit the scheduler
+    follows the appointment's new start (only confirmed ones get reminders).
+    """
+    if rescheduled:
+        AppointmentReminder.objects.filter(appointment_id=appointment.id).delete()
+    start = appointment_start(appointment.date, appointment.time) if appointment.status == "confirmed" else None
+    transaction.on_commit(partial(reminder_scheduler.reschedule, appointment.id, start))
+
+
+def appointment_deleted(appointment_id):
+    transaction.on_commit(partial(reminder_scheduler.reschedule, appointment_id, None))
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional
-from datetime import date, time
+from datetime import date, datetime, time
 
 class AppointmentCreate(BaseModel):
     doctor_id: int
@@ -30,4 +30,35 @@ class AppointmentOut(BaseModel):
 class SimplePatientResponse(BaseModel):
     id: int
     patient: str
-    doctor: Optional[str] = None
\ No newline at end of file
+    doctor: Optional[str] = None
+    first_seen: Optional[date] = None
+    last_seen: Optional[date] = None
+    visit_count: Optional[int] = None
+
+class AvailabilityWindow(BaseModel):
+    weekday: int = Field(..., ge=0, le=6)  # 0 = Monday
+    start_time: time
+    end_time: time
+    slot_minutes: int = Field(30, ge=5, le=240)
+
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.start_time >= self.end_time:
+            raise ValueError("start_time must be before end_time")
+        return self
+
+class AvailabilityUpdate(BaseModel):
+    windows: list[AvailabilityWindow] = Field(..., max_length=100)
+
+class BlockedPeriodCreate(BaseModel):
+    start: datetime
+    end: datetime
+    reason: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_period(self):
+        if (self.start.tzinfo is None) != (self.end.tzinfo is None):
+            raise ValueError("start and end must both have a UTC offset or neither")
+        if self.start >= self.end:
+            raise ValueError("start must be before end")
+        return self
@@ -1,8 +1,19 @@
+from datetime import date, datetime, time, timedelta
 from ninja import Router
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from users.models import User
-from .models import Appointment
-from .schemas import AppointmentCreate, AppointmentOut, AppointmentUpdate, SimplePatientResponse
+from users.media import media_url_builder
+from .availability import DoctorSchedule
+from .models import Appointment, BlockedPeriod, DoctorAvailability, DoctorPatient
+from .relations import add_visit, refresh_visits
+from .reminders import appointment_changed, appointment_deleted
+from .schemas import (
+    AppointmentCreate, AppointmentOut, AppointmentUpdate, SimplePatientResponse, AvailabilityUpdate, BlockedPeriodCreate
+)
 from users.auth import AuthBearer, AsyncAuthBearer
 from notifications.views import send_notification
 from notifications.utils import send_notification_to_user
@@ -10,8 +21,10 @@ from asgiref.sync import sync_to_async
 
 router = Router(tags=["Appointments"])
 
+MAX_SLOT_RANGE_DAYS = 31
+
 # Create an appointment
-@router.post("/create", response={200: AppointmentOut, 400: dict}, auth=AuthBearer())
+@router.post("/create", response={200: AppointmentOut, 400: dict, 409: dict}, auth=AuthBearer())
 def create_appointment(request, payload: AppointmentCreate):
     """
     Create a new appointment (only for patients).
@@ -23,15 +36,24 @@ def create_appointment(request, payload: AppointmentCreate):
 
     doctor = get_object_or_404(User, id=payload.doctor_id, role="doctor")
 
-    # Create the appointment
-    appointment = Appointment.objects.create(
-        patient=patient,
-        doctor=doctor,
-        date=payload.date,
-        time=payload.time,
-        reason=payload.reason,
-        status="pending"  # Assuming a default status for new appointments
-    )
+    error = DoctorSchedule(doctor.id, payload.date, payload.date).booking_error(payload.date, payload.time)
+    if error:
+        return 400, {"error": error}
+
+    # Create the appointment; unique_doctor_slot rejects a slot someone else just took
+    try:
+        with transaction.atomic():
+            appointment = Appointment.objects.create(
+                patient=patient,
+                doctor=doctor,
+                date=payload.date,
+                time=payload.time,
+                reason=payload.reason,
+                status="pending"  # Assuming a default status for new appointments
+            )
+            add_visit(doctor.id, patient.id, appointment.date)
+    except IntegrityError:
+        return 409, {"error": "That slot is already booked"}
 
     # Use the utility function to send the notification
     send_notification_to_user(doctor, f"New appointment request from {patient.username} on {payload.date} at {payload.time}.")
@@ -48,10 +70,21 @@ def create_appointment(request, payload: AppointmentCreate):
     }
 
 
-@router.get("/list", response={200: list[AppointmentOut]}, auth=AuthBearer())
-def list_appointments(request):
+def appointment_cursor(row):
+    return f"{row['date'].isoformat()},{row['time'].isoformat()},{row['id']}"
+
+
+def parse_appointment_cursor(cursor):
+    day, at, appointment_id = cursor.split(",")
+    return date.fromisoformat(day), time.fromisoformat(at), int(appointment_id)
+
+
+@router.get("/list", response={200: list[AppointmentOut], 400: dict}, auth=AuthBearer())
+def list_appointments(request, response: HttpResponse, start_date: date = None, end_date: date = None,
+                      status: str = None, cursor: str = None, limit: int = None):
     """
-    List appointments for the logged-in user (patients see their own, doctors see theirs).
+    List appointments for the logged-in user (patients see their own, doctors see theirs),
+    oldest first. With a limit, the X-Next-Cursor header holds the cursor of the next page.
     """
     user = request.auth
 
@@ -62,33 +95,170 @@ def list_appointments(request):
     else:
         return 400, {"error": "Unauthorized"}
 
-    response_data = []
+    if status is not None and status not in dict(Appointment.STATUS_CHOICES):
+        return 400, {"error": "status must be pending, confirmed or canceled"}
+
+    if limit is not None and not 1 <= limit <= 500:
+        return 400, {"error": "limit must be between 1 and 500"}
+
+    if start_date:
+        appointments = appointments.filter(date__gte=start_date)
+    if end_date:
+        appointments = appointments.filter(date__lte=end_date)
+    if status:
+        appointments = appointments.filter(status=status)
+    if cursor:
+        try:
+            after_date, after_time, after_id = parse_appointment_cursor(cursor)
+        except ValueError:
+            return 400, {"error": "Invalid cursor"}
+        appointments = appointments.filter(
+            Q(date__gt=after_date)
+            | Q(date=after_date, time__gt=after_time)
+            | Q(date=after_date, time=after_time, id__gt=after_id)
+        )
+
+    rows = appointments.order_by("date", "time", "id").values(
+        "id", "date", "time", "status", "reason",
+        patient_username=F("patient__username"),
+        patient_role=F("patient__role"),
+        patient_thumbnail=F("patient__profile_thumbnail"),
+        patient_picture=F("patient__profile_picture"),
+        doctor_username=F("doctor__username"),
+        doctor_role=F("doctor__role"),
+    )
+    if limit is not None:
+        rows = list(rows[:limit + 1])
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response["X-Next-Cursor"] = appointment_cursor(rows[-1])
+
+    role_names = dict(User.ROLES)
+    media_url = media_url_builder(request)
+
+    # Same "username (Role)" strings as str(user)
+    return [
+        {
+            "id": a["id"],
+            "patient": f"{a['patient_username']} ({role_names.get(a['patient_role'], a['patient_role'])})",
+            "doctor": f"{a['doctor_username']} ({role_names.get(a['doctor_role'], a['doctor_role'])})",
+            "patient_profile_picture": media_url(a["patient_thumbnail"], a["patient_picture"]),
+            "date": a["date"],
+            "time": a["time"],
+            "status": a["status"],
+            "reason": a["reason"],
+        }
+        for a in rows
+    ]
+
+
+# Free slots of a doctor
+@router.get("/slots/{doctor_id}", response={200: dict, 400: dict}, auth=AuthBearer())
+def get_free_slots(request, doctor_id: int, start_date: date = None, end_date: date = None):
+    """
+    Open slots per day between start_date (default today) and end_date
+    (default a week later). Doctors without working hours return no slots
+    and can be booked at any time that is not blocked.
+    """
+    doctor = get_object_or_404(User, id=doctor_id, role="doctor")
+    now = timezone.localtime().replace(tzinfo=None)
+    start_date = start_date or now.date()
+    end_date = end_date or start_date + timedelta(days=6)
 
-    for a in appointments:
-        # Fetch patient and doctor user objects
-        patient_user = a.patient
-        doctor_user = a.doctor
+    if end_date < start_date or (end_date - start_date).days >= MAX_SLOT_RANGE_DAYS:
+        return 400, {"error": f"end_date must be on or after start_date and at most {MAX_SLOT_RANGE_DAYS} days later"}
 
-        # Build profile picture URLs
-        patient_profile_pic = request.build_absolute_uri(patient_user.profile_picture.url) if patient_user.profile_picture else None
-        # Append formatted appointment data
-        response_data.append({
-            "id": a.id,
-            "patient": str(patient_user), 
-            "doctor": str(doctor_user),
-            "patient_profile_picture": patient_profile_pic,
-            "date": a.date,
-            "time": a.time,
-            "status": a.status,
-            "reason": a.reason,
-        })
+    schedule = DoctorSchedule(doctor.id, start_date, end_date)
+    days = (start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1))
 
-    return response_data
+    return {
+        "doctor_id": doctor.id,
+        "working_hours": schedule.has_working_hours,
+        "slots": [
+            {"date": day, "times": times}
+            for day in days
+            if (times := schedule.free_slots(day, after=now))
+        ],
+    }
+
+
+# Get a doctor's working hours and upcoming blocked periods
+@router.get("/availability/{doctor_id}", response={200: dict}, auth=AuthBearer())
+def get_availability(request, doctor_id: int):
+    doctor = get_object_or_404(User, id=doctor_id, role="doctor")
+    return {
+        "doctor_id": doctor.id,
+        "windows": list(
+            DoctorAvailability.objects.filter(doctor=doctor).order_by("weekday", "start_time")
+            .values("weekday", "start_time", "end_time", "slot_minutes")
+        ),
+        "blocked_periods": list(
+            BlockedPeriod.objects.filter(doctor=doctor, end__gt=timezone.now()).order_by("start")
+            .values("id", "start", "end", "reason")
+        ),
+    }
+
+
+# Set working hours (replaces the doctor's weekly windows)
+@router.put("/availability", response={200: dict, 400: dict}, auth=AuthBearer())
+def set_availability(request, payload: AvailabilityUpdate):
+    """
+    Existing appointments outside the new hours are kept.
+    """
+    doctor = request.auth
+    if doctor.role != "doctor":
+        return 400, {"error": "Only doctors can set working hours"}
 
+    with transaction.atomic():
+        DoctorAvailability.objects.filter(doctor=doctor).delete()
+        DoctorAvailability.objects.bulk_create([
+            DoctorAvailability(doctor=doctor, **window.dict()) for window in payload.windows
+        ])
+
+    return {"message": "Working hours updated", "windows": len(payload.windows)}
+
+
+# Block time off
+@router.post("/blocked-periods", response={200: dict, 400: dict}, auth=AuthBearer())
+def create_blocked_period(request, payload: BlockedPeriodCreate):
+    """
+    Make a period unbookable. Appointments already in it are not canceled;
+    their count is returned so the doctor can reschedule them.
+    """
+    doctor = request.auth
+    if doctor.role != "doctor":
+        return 400, {"error": "Only doctors can block time"}
+
+    start, end = payload.start, payload.end
+    if timezone.is_naive(start):
+        start, end = timezone.make_aware(start), timezone.make_aware(end)
+
+    period = BlockedPeriod.objects.create(doctor=doctor, start=start, end=end, reason=payload.reason)
+
+    local_start, local_end = timezone.localtime(start), timezone.localtime(end)
+    affected = sum(
+        1
+        for day, at in Appointment.objects.filter(doctor=doctor, date__range=(local_start.date(), local_end.date()))
+        .exclude(status="canceled").values_list("date", "time")
+        if local_start.replace(tzinfo=None) <= datetime.combine(day, at) < local_end.replace(tzinfo=None)
+    )
+
+    return {"id": period.id, "message": "Period blocked", "affected_appointments": affected}
+
+
+# Remove a blocked period
+@router.delete("/blocked-periods/{period_id}", response={200: dict, 400: dict}, auth=AuthBearer())
+def delete_blocked_period(request, period_id: int):
+    period = get_object_or_404(BlockedPeriod, id=period_id)
+    if request.auth.id != period.doctor_id:
+        return 400, {"error": "Unauthorized"}
+
+    period.delete()
+    return {"message": "Blocked period removed"}
 
 
 # Update an appointment
-@router.put("/update/{appointment_id}", response={200: AppointmentOut, 400: dict}, auth=AuthBearer())
+@router.put("/update/{appointment_id}", response={200: AppointmentOut, 400: dict, 409: dict}, auth=AuthBearer())
 def update_appointment(request, appointment_id: int, payload: AppointmentUpdate):
     """
     Update an appointment's status or reason (doctor can update).
@@ -98,10 +268,23 @@ def update_appointment(request, appointment_id: int, payload: AppointmentUpdate)
     if request.auth != appointment.doctor:
         return 400, {"error": "Unauthorized"}
 
+    moved = (payload.date, payload.time) != (appointment.date, appointment.time)
+    if moved:
+        error = DoctorSchedule(appointment.doctor_id, payload.date, payload.date).booking_error(payload.date, payload.time)
+        if error:
+            return 400, {"error": error}
+
     for attr, value in payload.dict(exclude_unset=True).items():
         setattr(appointment, attr, value)
 
-    appointment.save()
+    try:
+        with transaction.atomic():
+            appointment.save()
+            if moved:
+                refresh_visits(appointment.doctor_id, appointment.patient_id)
+            appointment_changed(appointment, rescheduled=moved)
+    except IntegrityError:
+        return 409, {"error": "That slot is already booked"}
 
     notification_recipient = appointment.patient if request.auth == appointment.doctor else appointment.doctor
     send_notification_to_user(notification_recipient, f"Your appointment has been updated to '{appointment.status}'.")
@@ -129,7 +312,10 @@ def delete_appointment(request, appointment_id: int):
     if request.auth != appointment.doctor and request.auth != appointment.patient:
         return 400, {"error": "Unauthorized"}
 
-    appointment.delete()
+    with transaction.atomic():
+        appointment_deleted(appointment.id)
+        appointment.delete()
+        refresh_visits(appointment.doctor_id, appointment.patient_id)
 
     notification_recipient = appointment.patient if request.auth == appointment.doctor else appointment.doctor
     send_notification_to_user(notification_recipient, f"Your appointment scheduled for {appointment.date} has been canceled.")
@@ -140,41 +326,47 @@ def delete_appointment(request, appointment_id: int):
 # Get all patients related to a specific doctor
 @router.get("/patients/{doctor_id}", response={200: list[SimplePatientResponse]}, auth=AuthBearer())
 def get_patients_of_doctor(request, doctor_id: int):
-    # Get the doctor by ID
+    """
+    Patients with at least one appointment with the doctor, most recently seen first.
+    """
     doctor = get_object_or_404(User, id=doctor_id, role="doctor")
 
-    # Get all appointments where the doctor is this one and get the patients related to it
-    appointments = Appointment.objects.filter(doctor=doctor)
-
-    # Extract the patients from these appointments (ensuring no duplicates)
-    patients = {appointment.patient.id: appointment.patient for appointment in appointments}
+    relations = DoctorPatient.objects.filter(doctor=doctor).order_by("-last_seen", "patient_id").values(
+        "patient_id", "first_seen", "last_seen", "visit_count", patient_username=F("patient__username"),
+    )
 
-    # Create response for each patient with only necessary details (id, patient username, doctor username)
-    patients_data = []
-    for patient in patients.values():
-        patients_data.append({
-            "id": patient.id,
-            "patient": patient.username,
+    return [
+        {
+            "id": r["patient_id"],
+            "patient": r["patient_username"],
             "doctor": doctor.username,
-        })
-
-    return patients_data
+            "first_seen": r["first_seen"],
+            "last_seen": r["last_seen"],
+            "visit_count": r["visit_count"],
+        }
+        for r in relations
+    ]
 
 # Get all patients who have at least one appointment
 @router.get("/patient/list", response={200: list[SimplePatientResponse]}, auth=AuthBearer())
 def get_patients_with_appointments(request):
-    # Get all appointments in the system
-    appointments = Appointment.objects.all()
-
-    # Extract the patients from these appointments (ensuring no duplicates)
-    patients = {appointment.patient.id: appointment.patient for appointment in appointments}
-
-    # Create response for each patient with only necessary details (id, patient username)
-    patients_data = []
-    for patient in patients.values():
-        patients_data.append({
-            "id": patient.id,
-            "patient": patient.username,
-        })
+    patients = (
+        DoctorPatient.objects.values("patient_id", patient_username=F("patient__username"))
+        .annotate(
+            first_seen=models.Min("first_seen"),
+            last_seen=models.Max("last_seen"),
+            visit_count=models.Sum("visit_count"),
+        )
+        .order_by("patient_username")
+    )
 
-    return patients_data
\ No newline at end of file
+    return [
+        {
+            "id": p["patient_id"],
+            "patient": p["patient_username"],
+            "first_seen": p["first_seen"],
+            "last_seen": p["last_seen"],
+            "visit_count": p["visit_count"],
+        }
+        for p in patients
+    ]
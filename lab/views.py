@@ -4,7 +4,7 @@ from users.models import User
 from .models import LabTest, StaffMessage
 from .schemas import LabTestCreate, LabTestUpdate, LabTestOut, MessageOut
 from users.auth import AuthBearer, AsyncAuthBearer
-from notifications.utils import send_notification_to_user
+from notifications.utils import send_notification_to_user, send_notification_to_role
 from asgiref.sync import sync_to_async
 from billings.models import Invoice
 lab_router = Router(tags=["Lab Tests"])
@@ -29,9 +29,7 @@ async def order_lab_test(request, payload: LabTestCreate):
     )
 
     # Notify all lab technicians (assuming multiple exist)
-    lab_technicians = await sync_to_async(list)(User.objects.filter(role="lab_technician"))
-    for technician in lab_technicians:
-        await send_notification_to_user(technician, f"New lab test ordered: {payload.test_name} by Dr. {doctor.username}.")
+    await sync_to_async(send_notification_to_role)("lab_technician", f"New lab test ordered: {payload.test_name} by Dr. {doctor.username}.")
 
     return {
     "id": lab_test.id,
@@ -104,12 +102,8 @@ def update_lab_test(request, lab_test_id: int, payload: LabTestUpdate):
 
     lab_test.save()
 
-    # Retrieve all cashiers
-    cashiers = User.objects.filter(role="cashier")
-    
     # Notify all cashiers
-    for cashier in cashiers:
-        send_notification_to_user(cashier, f"Lab Test: {lab_test.test_name} for {lab_test.patient} was generated; create an invoice")
+    send_notification_to_role("cashier", f"Lab Test: {lab_test.test_name} for {lab_test.patient} was generated; create an invoice")
 
     send_notification_to_user(lab_test.doctor, f"Lab result for {lab_test.test_name} is now available. Check out you inbox")
     
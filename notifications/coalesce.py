@@ -0,0 +1,70 @@
+import asyncio
+from django.conf import settings
+from .utils import send_real_time_notification_to_user
+
+# Seconds during which repeats from the same source are collapsed, keyed by
+# the source prefix ("chat:12" -> "chat"). Sources without an entry use "default".
+COALESCE_DEFAULTS = {
+    "default": 0,
+    "chat": 3,
+}
+
+
+def coalesce_window(source: str) -> float:
+    windows = {**COALESCE_DEFAULTS, **getattr(settings, "NOTIFICATION_COALESCE_WINDOWS", {})}
+    return windows.get(source.split(":", 1)[0], windows["default"])
+
+
+class _PendingWindow:
+    def __init__(self, recipient, message):
+        self.recipient = recipient
+        self.message = message
+        self.count = 0  # Repeats collapsed since the last send
+
+
+class NotificationCoalescer:
+    """
+    Collapses bursts of real-time notifications per (recipient, source).
+
+    The first notification goes out immediately and opens a window. Repeats
+    inside the window are only counted; when it closes they are sent as one
+    message carrying the count, and a new window opens if anything was sent.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._tasks = set()
+
+    async def send(self, recipient, message: str, source: str, window: float = None):
+        key = (recipient.id, source)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.message = message
+            pending.count += 1
+            return
+
+        await send_real_time_notification_to_user(recipient, message)
+
+        window = coalesce_window(source) if window is None else window
+        if window <= 0:
+            return
+
+        self._pending[key] = _PendingWindow(recipient, message)
+        task = asyncio.create_task(self._run_window(key, window))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_window(self, key, window: float):
+        try:
+            while True:
+                await asyncio.sleep(window)
+                pending = self._pending[key]
+                if not pending.count:
+                    return
+                count, pending.count = pending.count, 0
+                await send_real_time_notification_to_user(pending.recipient, pending.message, count=count)
+        finally:
+            self._pending.pop(key, None)
+
+
+coalescer = NotificationCoalescer()
@@ -1,21 +1,71 @@
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
+from .presence import presence
+from .sendqueue import BoundedSendMixin
+from .utils import missed_notifications, notification_frame
+
+class NotificationConsumer(BoundedSendMixin, AsyncWebsocketConsumer):
+    # Logical channel name added to every frame when notifications share a
+    # socket with other streams (see patients.consumers.MultiplexConsumer)
+    frame_channel = None
+
+    def tag_frame(self, frame):
+        if self.frame_channel is None:
+            return frame
+        return {"channel": self.frame_channel, **frame}
 
-class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         if not self.user.is_authenticated:
             await self.close()
         else:
             self.group_name = f"user_{self.user.id}"
+            # Role-wide broadcasts (see notifications.utils.send_notification_to_roles)
+            self.role_group_name = f"role_{self.user.role}"
+            # Highest notification id sent by replay_missed
+            self.replayed_up_to = 0
             await self.channel_layer.group_add(self.group_name, self.channel_name)
+            await self.channel_layer.group_add(self.role_group_name, self.channel_name)
+            await presence.aadd(self.user.id, self.group_name, self.role_group_name)
             await self.accept()
 
+            # Reconnecting clients pass the last id they saw: ws/notifications/?last_seen_id=123
+            query_params = parse_qs(self.scope["query_string"].decode())
+            last_seen_id = query_params.get("last_seen_id", [None])[0]
+            if last_seen_id and last_seen_id.isdigit():
+                await self.replay_missed(int(last_seen_id))
+
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, "group_name"):
+            await presence.aremove(self.user.id, self.group_name, self.role_group_name)
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.channel_layer.group_discard(self.role_group_name, self.channel_name)
 
     async def receive(self, text_data):
         pass  # No need for receiving, only sending messages
 
+    async def replay_missed(self, last_seen_id: int):
+        """
+        Send unread notifications newer than last_seen_id, oldest first, before
+        any live message. Groups are joined first so nothing falls in between;
+        live duplicates of replayed rows are dropped in send_notification.
+        """
+        self.replayed_up_to = last_seen_id
+        async for n in missed_notifications(self.user, last_seen_id):
+            self.replayed_up_to = n["id"]
+            await self.send_notification_frame(self.tag_frame({
+                "id": n["id"],
+                "message": n["message"],
+                "created_at": n["created_at"].isoformat(),
+                "replayed": True,
+            }))
+
+        await self.send(text_data=json.dumps(self.tag_frame({"replay_complete": True, "last_seen_id": self.replayed_up_to})))
+
     async def send_notification(self, event):
-        await self.send(text_data=json.dumps({"message": event["message"]}))
+        frame = notification_frame(event, self.user.id)
+        if frame["id"] is not None and frame["id"] <= self.replayed_up_to:
+            return  # Already sent during replay
+
+        await self.send_notification_frame(self.tag_frame(frame))
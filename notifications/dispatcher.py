@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import uuid
+from contextlib import suppress
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils.timezone import now
+
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DEFAULTS = {
+    "BATCH_SIZE": 100,        # rows claimed per drain
+    "MAX_ATTEMPTS": 8,        # after this a row is marked failed
+    "BACKOFF_BASE": 0.5,      # seconds, doubled on every failed attempt
+    "BACKOFF_MAX": 60,        # upper bound for the retry delay
+    "POLL_INTERVAL": 5,       # idle wake-up, picks up rows committed by other processes
+    "LEASE": 30,              # seconds a claimed row is hidden from other dispatchers
+}
+
+
+def outbox_setting(name):
+    return getattr(settings, "NOTIFICATION_OUTBOX", {}).get(name, OUTBOX_DEFAULTS[name])
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Exponential backoff for the given number of failed attempts.
+    """
+    return min(outbox_setting("BACKOFF_BASE") * (2 ** (attempts - 1)), outbox_setting("BACKOFF_MAX"))
+
+
+class OutboxDispatcher:
+    """
+    Drains NotificationOutbox rows into the channel layer from a task running
+    on the ASGI server's event loop, so HTTP requests never wait on delivery.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+
+    def start(self):
+        """
+        Start the drain loop on the running event loop (no-op if already running).
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+        self._loop = None
+
+    def wake(self):
+        """
+        Ask the dispatcher to drain now. Safe to call from any thread, it is
+        registered with transaction.on_commit by notifications.utils.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # Not running in this process; the rows wait for a dispatcher
+        loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                drained = await self.drain()
+            except Exception:
+                logger.exception("Notification outbox drain failed")
+                drained = 0
+
+            if drained >= outbox_setting("BATCH_SIZE"):
+                continue  # Backlog left, keep going
+
+            try:
+                timeout = await sync_to_async(self._seconds_until_next_attempt)()
+            except Exception:
+                timeout = outbox_setting("POLL_INTERVAL")
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            self._wakeup.clear()
+
+    async def drain(self):
+        """
+        Deliver one batch of due outbox rows. Returns the number of rows claimed.
+        """
+        rows = await sync_to_async(self._claim_batch)()
+        if not rows:
+            return 0
+
+        channel_layer = get_channel_layer()
+        delivered, failed = [], []
+        for row in rows:
+            try:
+                await channel_layer.group_send(row.group, row.payload)
+            except Exception as e:
+                failed.append((row, e))
+            else:
+                delivered.append(row.id)
+
+        await sync_to_async(self._finish_batch)(delivered, failed)
+        return len(rows)
+
+    def _claim_batch(self):
+        # The claim pushes next_attempt_at forward by the lease, so concurrent
+        # dispatchers (one per worker process) never pick up the same rows.
+        token = uuid.uuid4().hex
+        current = now()
+        due = NotificationOutbox.objects.filter(status="pending", next_attempt_at__lte=current)
+        ids = list(due.order_by("id").values_list("id", flat=True)[:outbox_setting("BATCH_SIZE")])
+        if not ids:
+            return []
+
+        due.filter(id__in=ids).update(
+            claim_token=token,
+            next_attempt_at=current + timedelta(seconds=outbox_setting("LEASE")),
+        )
+        return list(NotificationOutbox.objects.filter(claim_token=token).order_by("id"))
+
+    def _finish_batch(self, delivered, failed):
+        if delivered:
+            NotificationOutbox.objects.filter(id__in=delivered).delete()
+
+        current = now()
+        for row, error in failed:
+            row.attempts += 1
+            row.last_error = str(error)
+            row.claim_token = None
+            if row.attempts >= outbox_setting("MAX_ATTEMPTS"):
+                row.status = "failed"
+                logger.error("Giving up on outbox message %s for %s: %s", row.id, row.group, error)
+            else:
+                row.next_attempt_at = current + timedelta(seconds=retry_delay(row.attempts))
+            row.save(update_fields=["attempts", "last_error", "claim_token", "status", "next_attempt_at"])
+
+    def _seconds_until_next_attempt(self):
+        poll_interval = outbox_setting("POLL_INTERVAL")
+        next_attempt_at = (
+            NotificationOutbox.objects.filter(status="pending")
+            .order_by("next_attempt_at")
+            .values_list("next_attempt_at", flat=True)
+            .first()
+        )
+        if next_attempt_at is None:
+            return poll_interval
+        return max(0, min((next_attempt_at - now()).total_seconds(), poll_interval))
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,441 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import string
+import threading
+import time
+from contextlib import contextmanager
+from copy import deepcopy
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+
+_connections = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    inbox TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    body TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_messages_inbox ON channel_messages (inbox, id);
+CREATE TABLE IF NOT EXISTS channel_groups (
+    group_name TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (group_name, channel)
+);
+CREATE TABLE IF NOT EXISTS channel_presence (
+    user_id INTEGER NOT NULL,
+    group_name TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_presence_user ON channel_presence (user_id, group_name);
+CREATE INDEX IF NOT EXISTS channel_presence_group ON channel_presence (group_name);
+"""
+
+
+def _ring_doorbells(paths):
+    """
+    Wake the pollers of other processes after writing to their inboxes.
+    A missed ring only costs latency: pollers also wake every poll_interval.
+    """
+    bell = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        bell.setblocking(False)
+        for path in paths:
+            try:
+                bell.sendto(b"1", path)
+            except OSError:
+                pass  # Process gone or its doorbell buffer is already full
+    finally:
+        bell.close()
+
+
+def default_layer_path():
+    return str(settings.BASE_DIR / "channels.sqlite3")
+
+
+def sqlite_connection(path):
+    """
+    Thread-local connection to the shared layer database, created on first
+    use with the schema in place. WAL lets every worker read while one writes.
+    """
+    connections = getattr(_connections, "by_path", None)
+    if connections is None:
+        connections = _connections.by_path = {}
+
+    connection = connections.get(path)
+    if connection is None:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        connections[path] = connection
+    return connection
+
+
+@contextmanager
+def immediate_transaction(db):
+    """
+    Write transaction taken up front. Connections are in autocommit mode
+    (isolation_level=None), so `with db:` alone would not group statements:
+    a read-then-delete needs this to stay atomic across processes.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Channel layer shared by every ASGI worker process on one host through a
+    SQLite file, so a notification produced in one worker reaches sockets
+    held by another without Redis.
+
+    Each process owns the channels it creates (their names carry a process
+    prefix). Sends to a channel owned by this process go straight to an
+    in-memory queue; sends to other processes are written to the database
+    and picked up by the owner's poller, which a datagram on a Unix socket
+    ("doorbell") wakes immediately. Group membership lives in the database.
+    Messages must be JSON-serialisable.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        path=None,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        poll_interval=1,
+        **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = str(path or default_layer_path())
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.client_prefix = "".join(random.choice(string.ascii_letters) for i in range(12))
+        self.channels = {}
+        self.doorbell_dir = self.path + ".doorbells"
+        self._doorbell = None
+        self._poller = None
+        self._last_cleanup = 0
+
+    # Database helpers, run in a worker thread so the event loop never blocks
+
+    def _db(self):
+        return sqlite_connection(self.path)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _insert_messages(self, rows):
+        with self._db() as db:
+            db.executemany(
+                "INSERT INTO channel_messages (inbox, channel, body, expires) VALUES (?, ?, ?, ?)", rows
+            )
+        if hasattr(socket, "AF_UNIX"):
+            _ring_doorbells({self._doorbell_path(row[0]) for row in rows})
+
+    def _doorbell_path(self, inbox):
+        return os.path.join(self.doorbell_dir, f"{inbox}.sock")
+
+    def _clean_database(self, db):
+        now = time.time()
+        if now - self._last_cleanup > self.expiry:
+            # Messages and groups left behind by processes that went away,
+            # and messages that waited too long for room in a full channel
+            self._last_cleanup = now
+            db.execute("DELETE FROM channel_messages WHERE expires < ?", (now,))
+            db.execute("DELETE FROM channel_groups WHERE expires < ?", (now,))
+            db.execute("DELETE FROM channel_presence WHERE expires < ?", (now,))
+
+    def _fetch_inbox(self, inbox, limit=500):
+        db = self._db()
+        with immediate_transaction(db):
+            rows = db.execute(
+                "SELECT id, channel, body, expires FROM channel_messages WHERE inbox = ? ORDER BY id LIMIT ?",
+                (inbox, limit),
+            ).fetchall()
+            if rows:
+                db.execute("DELETE FROM channel_messages WHERE inbox = ? AND id <= ?", (inbox, rows[-1][0]))
+            self._clean_database(db)
+        return rows
+
+    def _peek_own_inbox(self, skip, limit=500):
+        """
+        Oldest messages for this process's channels, left in the table until
+        _delete_messages: only this process reads its inbox, and rows for a
+        full channel stay there until it has room or they expire. Channels
+        in `skip` (full ones) are passed over.
+        """
+        skip = list(skip)
+        rows = self._db().execute(
+            "SELECT id, channel, body, expires FROM channel_messages WHERE inbox = ? "
+            f"AND channel NOT IN ({', '.join('?' * len(skip))}) ORDER BY id LIMIT ?",
+            (self.client_prefix, *skip, limit),
+        ).fetchall()
+        return rows
+
+    def _delete_messages(self, ids):
+        db = self._db()
+        with immediate_transaction(db):
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                db.execute(f"DELETE FROM channel_messages WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            self._clean_database(db)
+
+    def _group_channels(self, group):
+        rows = self._db().execute(
+            "SELECT channel FROM channel_groups WHERE group_name = ? AND expires >= ?", (group, time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _group_add(self, group, channel):
+        with self._db() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO channel_groups (group_name, channel, expires) VALUES (?, ?, ?)",
+                (group, channel, time.time() + self.group_expiry),
+            )
+
+    def _group_discard(self, group, channel):
+        with self._db() as db:
+            db.execute("DELETE FROM channel_groups WHERE group_name = ? AND channel = ?", (group, channel))
+
+    def _flush(self):
+        db = self._db()
+        with immediate_transaction(db):
+            db.execute("DELETE FROM channel_messages")
+            db.execute("DELETE FROM channel_groups")
+            db.execute("DELETE FROM channel_presence")
+
+    # Channel layer API
+
+    def _inbox(self, channel):
+        """
+        Process-specific channels ("specific.<client prefix>!<id>") are routed
+        to their owner's inbox; any other channel is its own inbox.
+        """
+        if "!" in channel:
+            return self.non_local_name(channel)[:-1].rsplit(".", 1)[-1]
+        return channel
+
+    def _is_local(self, channel):
+        return "!" in channel and self._inbox(channel) == self.client_prefix
+
+    def _local_queue(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _clean_expired(self):
+        now = time.time()
+        for channel, queue in list(self.channels.items()):
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+                if queue.empty():
+                    self.channels.pop(channel, None)
+
+    async def new_channel(self, prefix="specific."):
+        """
+        Returns a new channel name owned by this process.
+        """
+        return "%s.%s!%s" % (
+            prefix.rstrip("."),
+            self.client_prefix,
+            "".join(random.choice(string.ascii_letters) for i in range(12)),
+        )
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+
+        if self._is_local(channel):
+            try:
+                self._local_queue(channel).put_nowait((time.time() + self.expiry, deepcopy(message)))
+            except asyncio.QueueFull:
+                raise ChannelFull(channel)
+            return
+
+        row = (self._inbox(channel), channel, json.dumps(message), time.time() + self.expiry)
+        await self._run(self._insert_messages, [row])
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if not self._is_local(channel):
+            return await self._receive_shared(channel)
+
+        self._ensure_poller()
+        queue = self._local_queue(channel)
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        finally:
+            if queue.empty():
+                self.channels.pop(channel, None)
+
+    async def _receive_shared(self, channel):
+        # Non process-specific channels are read straight from the database
+        queue = self._local_queue(channel)
+        while True:
+            if queue.empty():
+                # Shielded so rows already deleted from the database still
+                # reach the queue if this receive is cancelled meanwhile
+                await asyncio.shield(asyncio.ensure_future(self._claim_shared(channel, queue)))
+            if not queue.empty():
+                expires, message = queue.get_nowait()
+                if expires >= time.time():
+                    return message
+                continue
+            await asyncio.sleep(self.poll_interval)
+
+    async def _claim_shared(self, channel, queue):
+        # Claim no more than the local queue can take without waiting
+        limit = queue.maxsize - queue.qsize() if queue.maxsize else 500
+        if limit <= 0:
+            return
+        for _, _, body, expires in await self._run(self._fetch_inbox, channel, limit):
+            queue.put_nowait((expires, json.loads(body)))
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll_inbox())
+
+    def _open_doorbell(self):
+        if self._doorbell is not None or not hasattr(socket, "AF_UNIX"):
+            return
+        path = self._doorbell_path(self.client_prefix)
+        try:
+            os.makedirs(self.doorbell_dir, exist_ok=True)
+            doorbell = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            doorbell.setblocking(False)
+            doorbell.bind(path)
+        except OSError:
+            return  # Path too long or not writable: fall back to polling
+        self._doorbell = doorbell
+
+    def _close_doorbell(self):
+        if self._doorbell is not None:
+            self._doorbell.close()
+            self._doorbell = None
+            try:
+                os.unlink(self._doorbell_path(self.client_prefix))
+            except OSError:
+                pass
+
+    async def _wait_for_doorbell(self):
+        if self._doorbell is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_recv(self._doorbell, 64), self.poll_interval)
+        except asyncio.TimeoutError:
+            return
+        # Several rings may have piled up; one fetch serves them all
+        try:
+            while self._doorbell.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+
+    async def _poll_inbox(self):
+        """
+        Move messages other processes wrote for our channels into local queues.
+        """
+        self._open_doorbell()
+        try:
+            await self._drain_inbox()
+        finally:
+            self._close_doorbell()
+
+    async def _drain_inbox(self):
+        """
+        Move rows into local queues as far as each has room, like a local
+        send would. The rest of a full channel's rows (and the later ones,
+        to keep its order) stay in the table for a later pass.
+        """
+        last_clean = time.time()
+        full = set()
+        while True:
+            full = {channel for channel in full if channel in self.channels and self.channels[channel].full()}
+            rows = await self._run(self._peek_own_inbox, full)
+            taken = []
+            for row_id, channel, body, expires in rows:
+                if channel in full:
+                    continue
+                queue = self._local_queue(channel)
+                if queue.full():
+                    full.add(channel)
+                    continue
+                queue.put_nowait((expires, json.loads(body)))
+                taken.append(row_id)
+            if taken:
+                await self._run(self._delete_messages, taken)
+
+            if time.time() - last_clean > self.expiry:
+                last_clean = time.time()
+                self._clean_expired()
+
+            if len(rows) < 500 or not taken:
+                await self._wait_for_doorbell()
+
+    async def flush(self):
+        # Empty the queues in place: receivers may be waiting on them
+        for queue in self.channels.values():
+            while not queue.empty():
+                queue.get_nowait()
+        await self._run(self._flush)
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_add, group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_discard, group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+
+        remote_rows = []
+        expires = time.time() + self.expiry
+        body = None
+        for channel in await self._run(self._group_channels, group):
+            if self._is_local(channel):
+                try:
+                    self._local_queue(channel).put_nowait((expires, deepcopy(message)))
+                except asyncio.QueueFull:
+                    pass  # Like the other layers, group sends drop on a full channel
+            else:
+                body = body or json.dumps(message)
+                remote_rows.append((self._inbox(channel), channel, body, expires))
+
+        if remote_rows:
+            await self._run(self._insert_messages, remote_rows)
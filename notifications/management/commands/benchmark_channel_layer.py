@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from notifications.layers import SQLiteChannelLayer
+
+
+def _echo_worker(path, conn):
+    """
+    Child process: echo every message back to its reply_to channel.
+    """
+
+    async def run():
+        layer = SQLiteChannelLayer(path=path)
+        channel = await layer.new_channel()
+        conn.send(channel)
+        while True:
+            message = await layer.receive(channel)
+            if message.get("stop"):
+                return
+            await layer.send(message["reply_to"], {"type": "pong", "n": message["n"]})
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = "Compare the SQLite channel layer with the in-memory layer (throughput, fan-out, cross-process latency)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000, help="Messages per test")
+        parser.add_argument("--group-size", type=int, default=50, help="Channels in the fan-out group")
+        parser.add_argument("--pings", type=int, default=200, help="Cross-process round trips")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.sqlite3")
+            layers = {
+                "in-memory": lambda: InMemoryChannelLayer(capacity=options["messages"] + 1),
+                "sqlite": lambda: SQLiteChannelLayer(path=path, capacity=options["messages"] + 1),
+            }
+
+            self.stdout.write(f"{'test':<28}{'layer':<12}{'total (s)':>12}{'msg/s':>12}")
+            for name, factory in layers.items():
+                elapsed = asyncio.run(self.point_to_point(factory(), options["messages"]))
+                self.report("send/receive", name, elapsed, options["messages"])
+
+                elapsed, delivered = asyncio.run(
+                    self.fan_out(factory(), options["messages"] // options["group_size"] or 1, options["group_size"])
+                )
+                self.report(f"group_send x{options['group_size']}", name, elapsed, delivered)
+
+            latencies = self.cross_process(path, options["pings"])
+            latencies.sort()
+            self.stdout.write(
+                f"cross-process round trip (sqlite, {len(latencies)} pings): "
+                f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms"
+            )
+
+    def report(self, test, layer, elapsed, count):
+        self.stdout.write(f"{test:<28}{layer:<12}{elapsed:>12.3f}{count / elapsed:>12.0f}")
+
+    async def point_to_point(self, layer, count):
+        channel = await layer.new_channel()
+        start = time.perf_counter()
+        for n in range(count):
+            await layer.send(channel, {"type": "bench", "n": n})
+        for _ in range(count):
+            await layer.receive(channel)
+        return time.perf_counter() - start
+
+    async def fan_out(self, layer, sends, group_size):
+        channels = [await layer.new_channel() for _ in range(group_size)]
+        for channel in channels:
+            await layer.group_add("bench", channel)
+
+        start = time.perf_counter()
+        for n in range(sends):
+            await layer.group_send("bench", {"type": "bench", "n": n})
+        for channel in channels:
+            for _ in range(sends):
+                await layer.receive(channel)
+        elapsed = time.perf_counter() - start
+
+        for channel in channels:
+            await layer.group_discard("bench", channel)
+        return elapsed, sends * group_size
+
+    def cross_process(self, path, pings):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        worker = multiprocessing.Process(target=_echo_worker, args=(path, child_conn), daemon=True)
+        worker.start()
+        remote_channel = parent_conn.recv()
+
+        async def run():
+            layer = SQLiteChannelLayer(path=path)
+            reply_to = await layer.new_channel()
+            latencies = []
+            for n in range(pings):
+                start = time.perf_counter()
+                await layer.send(remote_channel, {"type": "ping", "n": n, "reply_to": reply_to})
+                await layer.receive(reply_to)
+                latencies.append(time.perf_counter() - start)
+            await layer.send(remote_channel, {"type": "ping", "stop": True})
+            await layer.close()
+            return latencies
+
+        try:
+            return asyncio.run(run())
+        finally:
+            worker.join(timeout=5)
@@ -1,5 +1,6 @@
 from django.db import models
 from users.models import User  
+from django.utils.timezone import now
 
 class Notification(models.Model):
     STATUS_CHOICES = [
@@ -12,5 +13,41 @@ class Notification(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='unread')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Missed-notification replay on reconnect (NotificationConsumer)
+            models.Index(fields=["recipient", "status", "id"]),
+        ]
+
     def __str__(self):
         return f"Notification for {self.recipient.username} - {self.status}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Channel-layer messages waiting to be delivered. Rows are written in the
+    same transaction as the Notification they announce and drained after
+    commit by notifications.dispatcher.OutboxDispatcher.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ]
+
+    group = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    claim_token = models.CharField(max_length=32, blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["claim_token"]),
+        ]
+
+    def __str__(self):
+        return f"Outbox message for {self.group} - {self.status}"
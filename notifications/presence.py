@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+
+
+class AsyncPresenceMixin:
+    """
+    Async variants of the registry methods for consumers and other code on
+    the event loop. _call decides where the sync method runs.
+    """
+
+    async def _call(self, func, *args):
+        return func(*args)
+
+    async def aadd(self, user_id, *groups):
+        await self._call(self.add, user_id, *groups)
+
+    async def aremove(self, user_id, *groups):
+        await self._call(self.remove, user_id, *groups)
+
+    async def ais_online(self, user_id) -> bool:
+        return await self._call(self.is_online, user_id)
+
+    async def ain_group(self, user_id, group) -> bool:
+        return await self._call(self.in_group, user_id, group)
+
+    async def agroup_online(self, group) -> bool:
+        return await self._call(self.group_online, group)
+
+
+class PresenceRegistry(AsyncPresenceMixin):
+    """
+    Open WebSocket connections per user and channel-layer group.
+
+    Consumers register the groups they join in connect() and release them in
+    disconnect(); notification utilities ask the registry before touching the
+    channel layer. This registry is process-local, which matches the
+    InMemoryChannelLayer: a socket is only reachable from its own process.
+    See SharedPresenceRegistry for the multi-process layer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Sync views read it from worker threads
+        self._groups = Counter()
+        self._user_groups = defaultdict(Counter)
+
+    def add(self, user_id, *groups):
+        with self._lock:
+            for group in groups:
+                self._groups[group] += 1
+                self._user_groups[user_id][group] += 1
+
+    def remove(self, user_id, *groups):
+        with self._lock:
+            user_groups = self._user_groups.get(user_id)
+            for group in groups:
+                self._groups[group] -= 1
+                if self._groups[group] <= 0:
+                    del self._groups[group]
+                if user_groups is not None:
+                    user_groups[group] -= 1
+                    if user_groups[group] <= 0:
+                        del user_groups[group]
+            if user_groups is not None and not user_groups:
+                del self._user_groups[user_id]
+
+    def is_online(self, user_id) -> bool:
+        """
+        True if the user has any open socket (notifications or chat).
+        """
+        with self._lock:
+            return user_id in self._user_groups
+
+    def in_group(self, user_id, group) -> bool:
+        """
+        True if the user has a socket joined to the given group.
+        """
+        with self._lock:
+            return group in self._user_groups.get(user_id, ())
+
+    def group_online(self, group) -> bool:
+        """
+        True if at least one socket is joined to the given group.
+        """
+        with self._lock:
+            return group in self._groups
+
+
+class SharedPresenceRegistry(AsyncPresenceMixin):
+    """
+    PresenceRegistry stored next to the SQLiteChannelLayer's tables, so
+    producers in one worker process see sockets held by every other worker.
+    Rows expire with the layer's group_expiry in case a worker dies.
+
+    The sync methods block on SQLite (up to its busy timeout while another
+    process writes); async code must use the a-prefixed variants, which run
+    them in a worker thread.
+    """
+
+    def __init__(self, path, expiry=86400):
+        self.path = path
+        self.expiry = expiry
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _db(self):
+        from .layers import sqlite_connection
+        return sqlite_connection(self.path)
+
+    def add(self, user_id, *groups):
+        expires = time.time() + self.expiry
+        with self._db() as db:
+            db.executemany(
+                "INSERT INTO channel_presence (user_id, group_name, expires) VALUES (?, ?, ?)",
+                [(user_id, group, expires) for group in groups],
+            )
+
+    def remove(self, user_id, *groups):
+        with self._db() as db:
+            for group in groups:
+                db.execute(
+                    "DELETE FROM channel_presence WHERE rowid = ("
+                    "SELECT rowid FROM channel_presence WHERE user_id = ? AND group_name = ? LIMIT 1)",
+                    (user_id, group),
+                )
+
+    def _exists(self, where, params):
+        row = self._db().execute(
+            f"SELECT 1 FROM channel_presence WHERE {where} AND expires >= ? LIMIT 1", (*params, time.time())
+        ).fetchone()
+        return row is not None
+
+    def is_online(self, user_id) -> bool:
+        return self._exists("user_id = ?", (user_id,))
+
+    def in_group(self, user_id, group) -> bool:
+        return self._exists("user_id = ? AND group_name = ?", (user_id, group))
+
+    def group_online(self, group) -> bool:
+        return self._exists("group_name = ?", (group,))
+
+
+def build_presence_registry():
+    """
+    Shared registry when the channel layer is shared between processes,
+    process-local otherwise.
+    """
+    layer = getattr(settings, "CHANNEL_LAYERS", {}).get("default", {})
+    if layer.get("BACKEND") == "notifications.layers.SQLiteChannelLayer":
+        from .layers import default_layer_path
+        config = layer.get("CONFIG", {})
+        return SharedPresenceRegistry(
+            str(config.get("path") or default_layer_path()),
+            expiry=config.get("group_expiry", 86400),
+        )
+    return PresenceRegistry()
+
+
+presence = build_presence_registry()
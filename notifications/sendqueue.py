@@ -0,0 +1,208 @@
+import asyncio
+import json
+from collections import deque
+from django.conf import settings
+
+SEND_QUEUE_DEFAULTS = {
+    "MAX_SIZE": 100,                   # frames buffered per connection
+    "OVERFLOW_POLICY": "drop_oldest",  # drop_oldest | coalesce | disconnect
+}
+
+# Close code sent with the resume hint when a slow client is disconnected
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+
+def send_queue_setting(name):
+    return getattr(settings, "WEBSOCKET_SEND_QUEUE", {}).get(name, SEND_QUEUE_DEFAULTS[name])
+
+
+class SendQueueMetrics:
+    """
+    Process-wide counters for the per-connection send queues.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.queued = 0
+        self.max_depth = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected = 0
+
+    def snapshot(self):
+        return {
+            "connections": self.connections,
+            "queued": self.queued,
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "disconnected": self.disconnected,
+        }
+
+
+send_queue_metrics = SendQueueMetrics()
+
+
+class _Frame:
+    __slots__ = ("text", "bytes", "notification", "close", "resume")
+
+    def __init__(self, text=None, bytes=None, notification=None, close=None, resume=False):
+        self.text = text
+        self.bytes = bytes
+        self.notification = notification  # Frame dict for droppable notification frames
+        self.close = close  # (code, reason) for the final close frame
+        self.resume = resume  # Resume hint, built from last_delivered_id when written
+
+
+class BoundedSendMixin:
+    """
+    Mixin for AsyncWebsocketConsumer that routes outgoing frames through a
+    bounded queue drained by one writer task, so a slow client cannot make
+    the worker buffer frames without limit.
+
+    Frames sent with send_notification_frame() may be dropped or coalesced
+    when the queue is full; everything sent with send() (chat messages,
+    errors) is kept, and the connection is closed with a resume hint instead.
+    close() is queued behind the pending frames, so they are written first.
+
+    The queue only fills while the writer is blocked in the server's send.
+    Servers that wait for the socket to drain (uvicorn's websockets
+    implementation) block it when a client reads slowly. Daphne does not:
+    it hands each frame to Twisted's unbounded transport buffer and returns
+    at once. Under daphne the queue therefore bounds the backlog on the
+    event loop only. A slow client grows daphne's buffer instead and does
+    not show up in max_depth or trigger the overflow policy.
+    """
+
+    _send_queue = None
+    _send_ready = None
+    _writer_task = None
+    _send_closed = False
+    last_delivered_id = None
+
+    def _ensure_send_queue(self):
+        if self._send_queue is None:
+            self._send_queue = deque()
+            self._send_ready = asyncio.Event()
+            self._writer_task = asyncio.create_task(self._write_frames())
+            send_queue_metrics.connections += 1
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if text_data is None and bytes_data is None:
+            raise ValueError("You must pass one of bytes_data or text_data")
+        await self._enqueue(_Frame(text=text_data, bytes=bytes_data))
+        if close:
+            await self.close(close)
+
+    async def close(self, code=None, reason=None):
+        if self._send_queue is None:
+            await super().close(code, reason)  # Nothing was queued, e.g. rejected in connect()
+            return
+        if self._send_closed:
+            return
+        self._send_closed = True
+        self._send_queue.append(_Frame(close=(code, reason)))  # Never dropped, whatever the size
+        send_queue_metrics.queued += 1
+        self._send_ready.set()
+
+    async def send_notification_frame(self, frame: dict):
+        await self._enqueue(_Frame(notification=frame))
+
+    async def _enqueue(self, frame: _Frame):
+        if self._send_closed:
+            return  # Closing, or disconnected as a slow consumer and the client will resume
+        self._ensure_send_queue()
+        queue = self._send_queue
+
+        if len(queue) >= send_queue_setting("MAX_SIZE") and not self._make_room(frame):
+            await self._disconnect_slow_consumer()
+            return
+
+        queue.append(frame)
+        send_queue_metrics.queued += 1
+        send_queue_metrics.max_depth = max(send_queue_metrics.max_depth, len(queue))
+        self._send_ready.set()
+
+    def _make_room(self, frame: _Frame) -> bool:
+        """
+        Apply the overflow policy. Returns False if the client must be disconnected.
+        """
+        policy = send_queue_setting("OVERFLOW_POLICY")
+        queue = self._send_queue
+        notifications = [f for f in queue if f.notification is not None]
+
+        if policy == "drop_oldest" and notifications:
+            queue.remove(notifications[0])
+            send_queue_metrics.queued -= 1
+            send_queue_metrics.dropped += 1
+            return True
+
+        if policy == "coalesce" and frame.notification is not None and notifications:
+            # Fold every queued notification into the incoming one
+            for queued in notifications:
+                queue.remove(queued)
+            send_queue_metrics.queued -= len(notifications)
+            send_queue_metrics.coalesced += len(notifications)
+
+            ids = [f.notification.get("id") for f in notifications + [frame] if f.notification.get("id") is not None]
+            frame.notification = {
+                **frame.notification,
+                "id": max(ids) if ids else None,
+                "count": sum(f.notification.get("count", 1) for f in notifications + [frame]),
+                "coalesced": True,
+            }
+            return True
+
+        return False
+
+    async def _disconnect_slow_consumer(self):
+        # Replace the backlog with the resume hint and the close frame. The
+        # writer sends them, so a stalled socket never blocks the caller.
+        self._send_closed = True
+        send_queue_metrics.disconnected += 1
+        queue = self._send_queue
+        send_queue_metrics.queued -= len(queue)
+        queue.clear()
+
+        # Tell the client where to resume (see NotificationConsumer's ?last_seen_id=)
+        queue.append(_Frame(resume=True))
+        queue.append(_Frame(close=(SLOW_CONSUMER_CLOSE_CODE, None)))
+        send_queue_metrics.queued += 2
+        self._send_ready.set()
+
+    async def _write_frames(self):
+        queue = self._send_queue
+        while True:
+            await self._send_ready.wait()
+            while queue:
+                frame = queue.popleft()
+                send_queue_metrics.queued -= 1
+                try:
+                    if frame.close is not None:
+                        await super().close(*frame.close)
+                        return
+                    if frame.resume:
+                        await super().send(text_data=json.dumps({"resume": {"last_seen_id": self.last_delivered_id}}))
+                        continue
+                    if frame.notification is not None:
+                        await super().send(text_data=json.dumps(frame.notification))
+                        if frame.notification.get("id") is not None:
+                            self.last_delivered_id = frame.notification["id"]
+                    else:
+                        await super().send(text_data=frame.text, bytes_data=frame.bytes)
+                except Exception:
+                    return  # Transport is gone; websocket_disconnect cleans up
+            self._send_ready.clear()
+
+    def _stop_writer(self):
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+
+    async def websocket_disconnect(self, message):
+        if self._send_queue is not None:
+            self._stop_writer()
+            send_queue_metrics.queued -= len(self._send_queue)
+            send_queue_metrics.connections -= 1
+            self._send_queue.clear()
+        await super().websocket_disconnect(message)
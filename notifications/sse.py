@@ -0,0 +1,77 @@
+import asyncio
+import json
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .presence import presence
+from .utils import missed_notifications, notification_frame
+
+SSE_DEFAULTS = {
+    "HEARTBEAT": 15,      # seconds between keep-alive comments
+    "RETRY": 5000,        # client reconnect delay in milliseconds
+}
+
+
+def sse_setting(name):
+    return getattr(settings, "NOTIFICATION_SSE", {}).get(name, SSE_DEFAULTS[name])
+
+
+def format_event(frame):
+    """
+    Encode a notification frame as one SSE event; the notification id becomes
+    the event id so browsers resume with Last-Event-ID.
+    """
+    lines = []
+    if frame.get("id") is not None:
+        lines.append(f"id: {frame['id']}")
+    lines.append("event: notification")
+    lines.append(f"data: {json.dumps(frame)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def notification_event_stream(user, last_seen_id=None):
+    """
+    Server-Sent Events version of NotificationConsumer: joins the same
+    channel-layer groups, replays what was missed since last_seen_id and
+    then streams live notifications with periodic heartbeats.
+    """
+    channel_layer = get_channel_layer()
+    channel_name = await channel_layer.new_channel()
+    groups = [f"user_{user.id}", f"role_{user.role}"]
+
+    for group in groups:
+        await channel_layer.group_add(group, channel_name)
+    await presence.aadd(user.id, *groups)
+
+    try:
+        yield f"retry: {sse_setting('RETRY')}\n\n"
+
+        replayed_up_to = 0
+        if last_seen_id is not None:
+            replayed_up_to = last_seen_id
+            async for n in missed_notifications(user, last_seen_id):
+                replayed_up_to = n["id"]
+                yield format_event({
+                    "id": n["id"],
+                    "message": n["message"],
+                    "created_at": n["created_at"].isoformat(),
+                    "replayed": True,
+                })
+
+        while True:
+            try:
+                event = await asyncio.wait_for(channel_layer.receive(channel_name), sse_setting("HEARTBEAT"))
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+
+            if event.get("type") != "send_notification":
+                continue
+
+            frame = notification_frame(event, user.id)
+            if frame["id"] is not None and frame["id"] <= replayed_up_to:
+                continue  # Already sent during replay
+            yield format_event(frame)
+    finally:
+        await presence.aremove(user.id, *groups)
+        for group in groups:
+            await channel_layer.group_discard(group, channel_name)
@@ -1,44 +1,184 @@
-from .models import Notification
+from django.conf import settings
+from django.db import transaction
+from .models import Notification, NotificationOutbox
+from .dispatcher import outbox_dispatcher
+from .presence import presence
+from users.models import User
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
 def send_notification_to_user(recipient, message: str):
     """
     Internal utility to create and send a notification to a user.
+    The WebSocket message is queued in the outbox and delivered after commit;
+    offline users only get the DB row.
     """
-    # Save in DB
-    notification = Notification.objects.create(
-        recipient=recipient,
-        message=message
-    )
+    group_name = f"user_{recipient.id}"
 
-    # WebSocket send
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"user_{recipient.id}",
-        {
-            "type": "send_notification",
-            "message": message,
-        }
-    )
+    with transaction.atomic():
+        # Save in DB
+        notification = Notification.objects.create(
+            recipient=recipient,
+            message=message
+        )
+
+        # WebSocket send (queued in the same transaction)
+        if presence.in_group(recipient.id, group_name):
+            NotificationOutbox.objects.create(
+                group=group_name,
+                payload={
+                    "type": "send_notification",
+                    "id": notification.id,
+                    "message": message,
+                    "created_at": notification.created_at.isoformat(),
+                }
+            )
+            transaction.on_commit(outbox_dispatcher.wake)
 
     return notification
 
 
-async def send_real_time_notification_to_user(recipient, message: str):
+def send_notification_to_users(recipient_ids, message: str):
+    """
+    Create the same notification for many users with one INSERT, and queue
+    the WebSocket push only for recipients who are online.
+    """
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create([
+            Notification(recipient_id=recipient_id, message=message)
+            for recipient_id in recipient_ids
+        ])
+
+        outbox = [
+            NotificationOutbox(
+                group=f"user_{n.recipient_id}",
+                payload={
+                    "type": "send_notification",
+                    "id": n.id,
+                    "message": message,
+                    "created_at": n.created_at.isoformat(),
+                }
+            )
+            for n in notifications
+            if presence.in_group(n.recipient_id, f"user_{n.recipient_id}")
+        ]
+        if outbox:
+            NotificationOutbox.objects.bulk_create(outbox)
+            transaction.on_commit(outbox_dispatcher.wake)
+
+    return notifications
+
+
+def send_notification_to_roles(roles, message: str):
+    """
+    Create a notification for every user holding one of the given roles and
+    broadcast it once per role group instead of once per recipient.
+    """
+    recipient_ids = User.objects.filter(role__in=roles).values_list("id", flat=True)
+
+    with transaction.atomic():
+        # Save in DB with a single INSERT
+        notifications = Notification.objects.bulk_create([
+            Notification(recipient_id=recipient_id, message=message)
+            for recipient_id in recipient_ids
+        ])
+
+        # WebSocket send, one message per role group with someone online
+        # (see NotificationConsumer.connect)
+        online_groups = [f"role_{role}" for role in roles if presence.group_online(f"role_{role}")]
+        if notifications and online_groups:
+            NotificationOutbox.objects.bulk_create([
+                NotificationOutbox(
+                    group=group_name,
+                    payload={
+                        "type": "send_notification",
+                        # Each member picks its own row id (JSON keys are strings)
+                        "ids": {str(n.recipient_id): n.id for n in notifications},
+                        "message": message,
+                        "created_at": notifications[0].created_at.isoformat(),
+                    }
+                )
+                for group_name in online_groups
+            ])
+            transaction.on_commit(outbox_dispatcher.wake)
+
+    return notifications
+
+
+def send_notification_to_role(role: str, message: str):
+    """
+    Create and broadcast a notification to every user with the given role.
+    """
+    return send_notification_to_roles([role], message)
+
+
+async def send_real_time_notification_to_user(recipient, message: str, count: int = 1):
     """
     Send a real-time notification to a user (no DB save).
-    This will send the message to the user's WebSocket group.
+    This will send the message to the user's WebSocket group, if they have one open.
+    count > 1 means the message stands for several collapsed notifications
+    (see notifications.coalesce).
     """
+    if not await presence.ain_group(recipient.id, f"user_{recipient.id}"):
+        return
+
     # Get the channel layer
     channel_layer = get_channel_layer()
 
+    event = {
+        "type": "send_notification",  # This will be handled by the consumer
+        "message": message,  # The message content
+    }
+    if count > 1:
+        event["count"] = count
+
     # Send the notification to the WebSocket group of the recipient
     await channel_layer.group_send(
         f"user_{recipient.id}",  # WebSocket group for the user
-        {
-            "type": "send_notification",  # This will be handled by the consumer
-            "message": message,  # The message content
-        }
+        event
     )
 
+
+REPLAY_DEFAULTS = {
+    "CHUNK_SIZE": 50,   # rows fetched from the cursor at a time
+    "PAGE_SIZE": 500,   # rows per replay query; pages continue until the backlog is empty
+}
+
+
+def replay_setting(name):
+    return getattr(settings, "NOTIFICATION_REPLAY", {}).get(name, REPLAY_DEFAULTS[name])
+
+
+async def missed_notifications(user, last_seen_id: int):
+    """
+    Unread notifications newer than last_seen_id, oldest first, for clients
+    resuming a live stream. Yields every one of them, reading PAGE_SIZE rows
+    per query (keyset on id) in CHUNK_SIZE chunks.
+    """
+    page_size, chunk_size = replay_setting("PAGE_SIZE"), replay_setting("CHUNK_SIZE")
+    while True:
+        page = (
+            Notification.objects.filter(recipient=user, status="unread", id__gt=last_seen_id)
+            .order_by("id")
+            .values("id", "message", "created_at")[:page_size]
+        )
+        fetched = 0
+        async for n in page.aiterator(chunk_size=chunk_size):
+            fetched += 1
+            last_seen_id = n["id"]
+            yield n
+        if fetched < page_size:
+            return
+
+
+def notification_frame(event, user_id):
+    """
+    Client-facing payload for a send_notification channel-layer event.
+    """
+    frame = {
+        "id": event.get("id") or event.get("ids", {}).get(str(user_id)),
+        "message": event["message"],
+        "created_at": event.get("created_at"),
+    }
+    if "count" in event:
+        frame["count"] = event["count"]  # Collapsed burst, see notifications.coalesce
+    return frame
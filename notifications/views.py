@@ -1,11 +1,13 @@
 from ninja import Router
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from users.models import User
 from .models import Notification
 from .schemas import NotificationCreate, NotificationOut
-from users.auth import AuthBearer  
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from users.auth import AuthBearer, AsyncAuthBearer
+from .utils import send_notification_to_user
+from .sse import notification_event_stream
+from .sendqueue import send_queue_metrics
 
 notifications_router = Router(tags=["Notifications"], auth=AuthBearer())
 
@@ -17,23 +19,8 @@ def send_notification(request, payload: NotificationCreate):
     """
     recipient = get_object_or_404(User, id=payload.recipient_id)
 
-    # Store notification in the database
-    notification = Notification.objects.create(
-        recipient=recipient,
-        message=payload.message
-    )
-
-    # Get WebSocket channel layer
-    channel_layer = get_channel_layer()
-
-    # Send real-time WebSocket notification
-    async_to_sync(channel_layer.group_send)(
-        f"user_{recipient.id}",
-        {
-            "type": "send_notification",
-            "message": payload.message,
-        }
-    )
+    # Store notification in the database; the WebSocket push goes through the outbox
+    notification = send_notification_to_user(recipient, payload.message)
 
     return notification
 
@@ -58,6 +45,27 @@ def list_notifications(request):
     ]
 
 
+# Live notification stream for clients that cannot hold a WebSocket
+@notifications_router.get("/stream", auth=AsyncAuthBearer())
+async def stream_notifications(request, last_event_id: int = None):
+    """
+    Server-Sent Events stream of the logged-in user's notifications.
+    Resumes after the Last-Event-ID header (or ?last_event_id=) when given.
+    """
+    user = request.auth
+
+    header_id = request.headers.get("Last-Event-ID")
+    if header_id and header_id.isdigit():
+        last_event_id = int(header_id)
+
+    response = StreamingHttpResponse(
+        notification_event_stream(user, last_event_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Keep nginx from buffering the stream
+    return response
+
 
 # Mark a notification as read
 @notifications_router.put("/mark-read/{notification_id}", response={200: NotificationOut, 400: dict})
@@ -92,4 +100,16 @@ def delete_notification(request, notification_id: int):
     notification = get_object_or_404(Notification, id=notification_id, recipient=user)
 
     notification.delete()
-    return {"message": "Notification deleted successfully"}
\ No newline at end of file
+    return {"message": "Notification deleted successfully"}
+
+
+# WebSocket send-queue metrics for this worker process
+@notifications_router.get("/metrics/send-queues", response={200: dict, 400: dict})
+def get_send_queue_metrics(request):
+    """
+    Queue depth and overflow counters of the WebSocket consumers.
+    """
+    if request.auth.role != "manager":
+        return 400, {"error": "Only managers can view metrics"}
+
+    return send_queue_metrics.snapshot()
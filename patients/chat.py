@@ -0,0 +1,51 @@
+from channels.layers import get_channel_layer
+from django.utils.timezone import now
+from notifications.coalesce import coalescer
+from notifications.presence import presence
+from .chatbuffer import chat_write_buffer
+from .models import ChatMessage, conversation_key
+
+
+def chat_room_name(user_id, other_id):
+    """
+    Channel-layer group shared by both participants of a conversation.
+    """
+    return f"chat_{conversation_key(user_id, other_id)}"
+
+
+async def post_chat_message(sender, receiver, message_text: str):
+    """
+    Queue a chat message for storage, notify the receiver if they don't have
+    the conversation open, and broadcast it to the conversation's room.
+    The message is stored by chat_write_buffer shortly after the broadcast.
+    """
+    room_group_name = chat_room_name(sender.id, receiver.id)
+
+    # Save message (write-behind, see patients.chatbuffer)
+    chat_message = ChatMessage(
+        sender=sender,
+        receiver=receiver,
+        conversation=conversation_key(sender.id, receiver.id),
+        message=message_text,
+        timestamp=now(),
+    )
+    chat_write_buffer.add(chat_message)
+
+    # No need to notify a receiver who already has this conversation open
+    if not await presence.ain_group(receiver.id, room_group_name):
+        await coalescer.send(receiver, f"Chat from {sender.username} ", source=f"chat:{sender.id}")
+
+    await get_channel_layer().group_send(
+        room_group_name,
+        {
+            "type": "chat.message",
+            "sender": sender.username,
+            "sender_id": sender.id,
+            "receiver": receiver.username,
+            "receiver_id": receiver.id,
+            "message": message_text,
+            "timestamp": str(chat_message.timestamp),
+        },
+    )
+
+    return chat_message
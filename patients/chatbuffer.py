@@ -0,0 +1,181 @@
+import asyncio
+import atexit
+import logging
+import threading
+from contextlib import suppress
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DataError, IntegrityError
+
+from .conversations import store_chat_messages
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITE_BUFFER_DEFAULTS = {
+    "FLUSH_INTERVAL_MS": 200,  # longest a message waits before it is stored
+    "MAX_MESSAGES": 100,       # buffered messages that trigger an early flush
+    "MAX_RETRIES": 5,          # failed flushes after which a message is dropped
+}
+
+
+def chat_buffer_setting(name):
+    return getattr(settings, "CHAT_WRITE_BUFFER", {}).get(name, CHAT_WRITE_BUFFER_DEFAULTS[name])
+
+
+class ChatWriteBuffer:
+    """
+    Write-behind store for chat messages. post_chat_message() broadcasts right
+    away and hands the unsaved ChatMessage here; a task on the ASGI event loop
+    stores the buffer with one bulk_create every FLUSH_INTERVAL_MS, or as soon
+    as MAX_MESSAGES are waiting, and updates the conversation summaries.
+
+    Consumers flush on disconnect, the lifespan middleware on shutdown, and an
+    atexit hook stores whatever is left when the server has no lifespan support.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._loop = None
+        self._task = None
+        self._lock = None
+        self._pending = None
+        self._full = None
+        self._sync_lock = threading.Lock()  # Guards the buffer swap against the atexit flush
+
+    def start(self):
+        """
+        Start the flush loop on the running event loop (no-op if already running).
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._lock = asyncio.Lock()
+        self._pending = asyncio.Event()
+        self._full = asyncio.Event()
+        if self._buffer:
+            self._pending.set()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Could not store %s buffered chat messages", len(self._buffer))
+        self._loop = None
+
+    def add(self, chat_message: ChatMessage):
+        """
+        Queue an unsaved ChatMessage for the next flush.
+        """
+        self.start()
+        with self._sync_lock:
+            self._buffer.append(chat_message)
+            size = len(self._buffer)
+        self._pending.set()
+        if size >= chat_buffer_setting("MAX_MESSAGES"):
+            self._full.set()
+
+    async def _run(self):
+        interval = chat_buffer_setting("FLUSH_INTERVAL_MS") / 1000
+        while True:
+            await self._pending.wait()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Chat message flush failed, retrying")
+                await asyncio.sleep(interval)
+
+    async def flush(self):
+        """
+        Store every buffered message now. Returns the number of messages stored.
+        Messages that failed for a transient reason go back to the front of
+        the buffer (see _store).
+        """
+        if self._lock is None:
+            return await sync_to_async(self.flush_sync)()
+
+        async with self._lock:
+            with self._sync_lock:
+                batch, self._buffer = self._buffer, []
+            self._pending.clear()
+            self._full.clear()
+            if not batch:
+                return 0
+
+            retry = await sync_to_async(self._store)(batch)
+            if retry:
+                with self._sync_lock:
+                    self._buffer[:0] = retry
+                self._pending.set()
+            return len(batch) - len(retry)
+
+    def flush_sync(self):
+        """
+        Store the buffer from synchronous code (atexit, management commands).
+        """
+        with self._sync_lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        retry = self._store(batch)
+        if retry:
+            with self._sync_lock:
+                self._buffer[:0] = retry
+        return len(batch) - len(retry)
+
+    def _store(self, batch):
+        """
+        Store a batch with one bulk insert, or one message at a time if that
+        fails, so a bad row cannot hold up the rest. Returns the messages to
+        retry later. Messages that can never be stored (e.g. a participant
+        was deleted) and those that failed MAX_RETRIES flushes are logged and
+        dropped.
+        """
+        try:
+            store_chat_messages(batch)
+            return []
+        except Exception:
+            logger.warning("Bulk store of %s chat messages failed, storing them one by one", len(batch), exc_info=True)
+
+        retry = []
+        for chat_message in batch:
+            chat_message.pk = None  # Id from the rolled-back insert
+            try:
+                store_chat_messages([chat_message])
+            except (IntegrityError, DataError):
+                logger.exception(
+                    "Dropping chat message from %s to %s that cannot be stored",
+                    chat_message.sender_id, chat_message.receiver_id,
+                )
+            except Exception:
+                attempts = getattr(chat_message, "_flush_attempts", 0) + 1
+                if attempts >= chat_buffer_setting("MAX_RETRIES"):
+                    logger.exception(
+                        "Dropping chat message from %s to %s after %s failed flushes",
+                        chat_message.sender_id, chat_message.receiver_id, attempts,
+                    )
+                    continue
+                chat_message._flush_attempts = attempts
+                retry.append(chat_message)
+        return retry
+
+
+chat_write_buffer = ChatWriteBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        chat_write_buffer.flush_sync()
+    except Exception:
+        logger.exception("Could not store buffered chat messages on exit")
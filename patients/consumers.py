@@ -1,18 +1,23 @@
 import json
+import logging
 from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from users.auth import AsyncAuthBearer
-from notifications.utils import send_real_time_notification_to_user
+from users.auth import get_user_from_token
+from notifications.consumers import NotificationConsumer
+from notifications.presence import presence
+from notifications.sendqueue import BoundedSendMixin
+from .chat import chat_room_name, post_chat_message
+from .chatbuffer import chat_write_buffer
 
-auth = AsyncAuthBearer()
+logger = logging.getLogger(__name__)
 
-class ChatConsumer(AsyncWebsocketConsumer):
+
+class ChatConsumer(BoundedSendMixin, AsyncWebsocketConsumer):
     async def connect(self):
         """
-        Authenticate user using AsyncAuthBearer when WebSocket connects.
+        Authenticate the user from the ?token= access token when WebSocket connects.
         """
-        from users.models import User 
-        from django.utils.timezone import now 
+        from users.models import User
 
         try:
             query_string = self.scope["query_string"].decode()
@@ -23,17 +28,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self.close(code=4000)  # Missing token
                 return
 
-            from users.models import User
-            from ninja_jwt.tokens import AccessToken  # This works with django-ninja-jwt
-
-            try:
-                validated_token = AccessToken(token)
-                user_id = validated_token["user_id"]
-                self.user = await User.objects.filter(id=user_id).afirst()
-            except Exception as e:
-                print(f"Token error: {e}")
-                await self.close(code=4001)  # Invalid token
-                return
+            self.user = await get_user_from_token(token)
 
             if not self.user:
                 await self.close(code=4001)  # Invalid token
@@ -58,9 +53,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.scope["receiver"] = self.receiver
 
             # Unique chat room for doctor-patient communication
-            self.room_group_name = f"chat_{min(self.user.id, self.receiver.id)}_{max(self.user.id, self.receiver.id)}"
+            self.room_group_name = chat_room_name(self.user.id, self.receiver.id)
 
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+            await presence.aadd(self.user.id, self.room_group_name)
             await self.accept()
 
         except Exception as e:
@@ -72,12 +68,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
         Remove user from WebSocket channel on disconnect.
         """
         if hasattr(self, "room_group_name"):
+            await presence.aremove(self.user.id, self.room_group_name)
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            # Store what this conversation still has buffered
+            await chat_write_buffer.flush()
 
     async def receive(self, text_data):
-        from .models import ChatMessage  
-        from django.utils.timezone import now
-
         try:
             data = json.loads(text_data)
             message_text = data.get("message")
@@ -86,30 +82,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self.send(text_data=json.dumps({"error": "Message is required"}))
                 return
 
-            receiver = self.receiver  # Use stored receiver from `connect()`
-
-            # Save message
-            chat_message = await ChatMessage.objects.acreate(
-                sender=self.user,
-                receiver=receiver,
-                message=message_text,
-                timestamp=now(),
-            )
-            
-            await send_real_time_notification_to_user(receiver, f"Chat from {self.user.username} ")
-
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "chat.message",
-                    "sender": self.user.username,
-                    "sender_id": self.user.id,  
-                    "receiver": receiver.username,
-                    "receiver_id": receiver.id,
-                    "message": message_text,
-                    "timestamp": str(chat_message.timestamp),
-                },
-            )
+            # Use stored receiver from `connect()`
+            await post_chat_message(self.user, self.receiver, message_text)
 
         except Exception as e:
             print(f"Error processing message: {e}")
@@ -121,3 +95,109 @@ class ChatConsumer(AsyncWebsocketConsumer):
         Send received message to WebSocket clients.
         """
         await self.send(text_data=json.dumps(event))
+
+
+class MultiplexConsumer(NotificationConsumer):
+    """
+    One socket per user carrying notifications and any number of chat
+    conversations as logical channels. Client frames:
+
+        {"action": "subscribe", "channel": "chat:<peer_id>"}
+        {"action": "unsubscribe", "channel": "chat:<peer_id>"}
+        {"action": "send", "channel": "chat:<peer_id>", "message": "..."}
+
+    Every server frame carries "channel": "notifications" or "chat:<peer_id>".
+    Connect with ws/stream/?token=<access token>[&last_seen_id=<id>].
+    """
+
+    frame_channel = "notifications"
+
+    async def connect(self):
+        query_params = parse_qs(self.scope["query_string"].decode())
+        token = query_params.get("token", [None])[0]
+
+        # Fall back to the session user from AuthMiddlewareStack
+        if token:
+            user = await get_user_from_token(token)
+            if not user:
+                await self.close(code=4001)  # Invalid token
+                return
+            self.scope["user"] = user
+
+        # peer_id -> (peer user, room group name)
+        self.conversations = {}
+        await super().connect()
+
+    async def disconnect(self, close_code):
+        for peer_id in list(getattr(self, "conversations", {})):
+            await self.leave_conversation(peer_id)
+        await super().disconnect(close_code)
+        if hasattr(self, "conversations"):
+            await chat_write_buffer.flush()
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+            action = data.get("action")
+            channel = data.get("channel") or ""
+            kind, _, peer_id = channel.partition(":")
+
+            if kind != "chat" or not peer_id.isdigit():
+                await self.send_error(channel, "Unknown channel")
+                return
+            peer_id = int(peer_id)
+
+            if action == "subscribe":
+                await self.join_conversation(peer_id)
+            elif action == "unsubscribe":
+                await self.leave_conversation(peer_id)
+                await self.send(text_data=json.dumps({"channel": channel, "unsubscribed": True}))
+            elif action == "send":
+                if peer_id not in self.conversations:
+                    await self.send_error(channel, "Not subscribed")
+                elif not data.get("message"):
+                    await self.send_error(channel, "Message is required")
+                else:
+                    peer, _ = self.conversations[peer_id]
+                    await post_chat_message(self.user, peer, data["message"])
+            else:
+                await self.send_error(channel, "Unknown action")
+
+        except Exception:
+            logger.exception("Error processing multiplexed message from user %s", self.user.id)
+            await self.send(text_data=json.dumps({"error": "Internal server error"}))
+
+    async def send_error(self, channel, error):
+        await self.send(text_data=json.dumps({"channel": channel, "error": error}))
+
+    async def join_conversation(self, peer_id):
+        from users.models import User
+
+        channel = f"chat:{peer_id}"
+        if peer_id not in self.conversations:
+            peer = await User.objects.filter(id=peer_id).afirst()
+            if not peer:
+                await self.send_error(channel, "Recipient not found")
+                return
+
+            room_group_name = chat_room_name(self.user.id, peer.id)
+            await self.channel_layer.group_add(room_group_name, self.channel_name)
+            await presence.aadd(self.user.id, room_group_name)
+            self.conversations[peer_id] = (peer, room_group_name)
+
+        await self.send(text_data=json.dumps({"channel": channel, "subscribed": True}))
+
+    async def leave_conversation(self, peer_id):
+        conversation = self.conversations.pop(peer_id, None)
+        if conversation is not None:
+            _, room_group_name = conversation
+            await presence.aremove(self.user.id, room_group_name)
+            await self.channel_layer.group_discard(room_group_name, self.channel_name)
+
+    async def chat_message(self, event):
+        """
+        Forward a room message on the conversation's logical channel.
+        """
+        peer_id = event["receiver_id"] if event["sender_id"] == self.user.id else event["sender_id"]
+        frame = {key: value for key, value in event.items() if key != "type"}
+        await self.send(text_data=json.dumps({"channel": f"chat:{peer_id}", **frame}))
@@ -0,0 +1,97 @@
+from django.db import models, transaction
+from django.db.models.functions import Greatest, Least
+from .models import ChatMessage, ConversationSummary
+
+
+def store_chat_messages(messages):
+    """
+    Store a batch of unsaved chat messages and fold them into both
+    participants' conversation summaries, in one transaction.
+    """
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(messages)
+        update_conversation_summaries(messages)
+
+
+def update_conversation_summaries(messages):
+    """
+    Move each (owner, peer) summary to the newest message of the batch and
+    add the messages the owner received to its unread count.
+    """
+    latest = {}
+    received = {}
+    for message in messages:  # Chronological, the last one wins
+        latest[(message.sender_id, message.receiver_id)] = message
+        latest[(message.receiver_id, message.sender_id)] = message
+        key = (message.receiver_id, message.sender_id)
+        received[key] = received.get(key, 0) + 1
+
+    missing, created_unread = [], []
+    for (owner_id, peer_id), message in latest.items():
+        unread = received.get((owner_id, peer_id), 0)
+        updated = ConversationSummary.objects.filter(owner_id=owner_id, peer_id=peer_id).update(
+            last_message=message.message,
+            last_message_at=message.timestamp,
+            unread_count=models.F("unread_count") + unread,
+        )
+        if not updated:
+            missing.append(ConversationSummary(
+                owner_id=owner_id,
+                peer_id=peer_id,
+                last_message=message.message,
+                last_message_at=message.timestamp,
+            ))
+            if unread:
+                created_unread.append((owner_id, peer_id, unread))
+
+    if missing:
+        # Another writer may create the row first: the upsert only sets the
+        # last message and the unread count is added on top either way
+        ConversationSummary.objects.bulk_create(
+            missing,
+            update_conflicts=True,
+            unique_fields=["owner", "peer"],
+            update_fields=["last_message", "last_message_at"],
+        )
+        for owner_id, peer_id, unread in created_unread:
+            ConversationSummary.objects.filter(owner_id=owner_id, peer_id=peer_id).update(
+                unread_count=models.F("unread_count") + unread,
+            )
+
+
+def rebuild_conversation_summaries(batch_size=2000):
+    """
+    Create or refresh both participants' summaries from the stored chat
+    messages, pointing each at the conversation's newest message. Unread
+    counts of existing summaries are kept; new ones start at zero since
+    messages do not record whether they were read. Returns the number of
+    summaries written.
+    """
+    last_ids = (
+        ChatMessage.objects
+        .values(low=Least("sender_id", "receiver_id"), high=Greatest("sender_id", "receiver_id"))
+        .annotate(last_id=models.Max("id"))
+        .values_list("last_id", flat=True)
+    )
+    messages = ChatMessage.objects.filter(id__in=last_ids).only(
+        "sender_id", "receiver_id", "message", "timestamp"
+    )
+    summaries = []
+    for message in messages.iterator(chunk_size=batch_size):
+        for owner_id, peer_id in ((message.sender_id, message.receiver_id), (message.receiver_id, message.sender_id)):
+            summaries.append(ConversationSummary(
+                owner_id=owner_id,
+                peer_id=peer_id,
+                last_message=message.message,
+                last_message_at=message.timestamp,
+            ))
+
+    with transaction.atomic():
+        ConversationSummary.objects.bulk_create(
+            summaries,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["owner", "peer"],
+            update_fields=["last_message", "last_message_at"],
+        )
+    return len(summaries)
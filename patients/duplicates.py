@@ -0,0 +1,226 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from users.models import User
+from .models import DuplicateCandidate
+
+DUPLICATE_DETECTION_DEFAULTS = {
+    "THRESHOLD": 0.8,         # pairs scoring below this are not queued
+    "MAX_BLOCK_SIZE": 1000,   # larger blocks are compared in overlapping windows of this size
+    "NAME_WEIGHT": 0.6,       # agreement weights, summing to 1
+    "BIRTH_DATE_WEIGHT": 0.25,
+    "PHONE_WEIGHT": 0.15,
+}
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+    "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+
+def duplicate_setting(name):
+    return getattr(settings, "DUPLICATE_DETECTION", {}).get(name, DUPLICATE_DETECTION_DEFAULTS[name])
+
+
+def soundex(name):
+    """
+    American Soundex of a (transliterated) name, e.g. "Tesfaye" -> "T210".
+    Empty string when the name has no Latin letters.
+    """
+    letters = re.sub(r"[^a-z]", "", (name or "").lower())
+    if not letters:
+        return ""
+    code, previous = letters[0].upper(), SOUNDEX_CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in "hw":  # h and w do not separate letters with the same code
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def normalize_name(*parts):
+    return " ".join(re.sub(r"[^a-z ]", "", " ".join(filter(None, parts)).lower()).split())
+
+
+def normalize_kebele(kebele):
+    # "Kebele 03", "03" and "3" are the same kebele
+    return re.sub(r"\b0+(\d)", r"\1", " ".join(re.findall(r"[a-z0-9]+", (kebele or "").lower()))).removeprefix("kebele ")
+
+
+def phone_key(phone):
+    # Last nine digits: 0911..., +251911... and 251911... are the same number
+    digits = re.sub(r"\D", "", phone or "")[-9:]
+    return int(digits) if len(digits) == 9 else 0
+
+
+class PatientRecords:
+    """
+    Column arrays over every patient, indexed by position, plus each name's
+    character trigrams as ids into a shared vocabulary.
+    """
+
+    def __init__(self, rows):
+        vocabulary = {}
+        ids, names, trigrams, birth_dates, birth_years, phones, genders = [], [], [], [], [], [], []
+        self.blocks = defaultdict(list)
+
+        for position, (user_id, first, middle, last, birth_date, phone, gender, kebele) in enumerate(rows):
+            name = normalize_name(first, middle, last)
+            padded = f" {name} "
+            ids.append(user_id)
+            names.append(name)
+            trigrams.append(np.fromiter(
+                (vocabulary.setdefault(padded[i:i + 3], len(vocabulary)) for i in range(len(padded) - 2)),
+                dtype=np.int64,
+            ))
+            birth_dates.append(birth_date.toordinal() if birth_date else 0)
+            birth_years.append(birth_date.year if birth_date else 0)
+            phones.append(phone_key(phone))
+            genders.append({"male": 1, "female": 2}.get(gender, 0))
+
+            # Blocking keys: only patients sharing one of them are compared
+            surname = soundex(last)
+            if surname:
+                if birth_date:
+                    self.blocks[("birth_year", surname, birth_date.year)].append(position)
+                kebele = normalize_kebele(kebele)
+                if kebele:
+                    self.blocks[("kebele", surname, kebele)].append(position)
+
+        self.ids = np.array(ids, dtype=np.int64)
+        self.names = names
+        self.trigrams = trigrams
+        self.birth_dates = np.array(birth_dates, dtype=np.int64)
+        self.birth_years = np.array(birth_years, dtype=np.int64)
+        self.phones = np.array(phones, dtype=np.int64)
+        self.genders = np.array(genders, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _name_similarity(records, members):
+    """
+    Cosine similarity of the members' trigram count vectors, all pairs at once.
+    """
+    trigrams = [records.trigrams[m] for m in members]
+    lengths = np.fromiter((len(t) for t in trigrams), dtype=np.int64, count=len(trigrams))
+    columns, local_columns = np.unique(np.concatenate(trigrams), return_inverse=True)
+    vectors = np.zeros((len(members), len(columns)), dtype=np.float32)
+    np.add.at(vectors, (np.repeat(np.arange(len(members)), lengths), local_columns), 1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+    return vectors @ vectors.T
+
+
+def score_block(records, members, threshold):
+    """
+    Score every pair within a block. Returns (ids, other ids, scores) of the
+    pairs at or above threshold.
+
+    Each field adds its weight on agreement, nothing on disagreement and half
+    its weight when either side is unknown; different recorded genders rule a
+    pair out.
+    """
+    members = np.asarray(members)
+    name = _name_similarity(records, members)
+
+    birth_dates = records.birth_dates[members]
+    known = birth_dates != 0
+    both_known = known[:, None] & known[None, :]
+    years = records.birth_years[members]
+    birth_date = np.where(
+        both_known,
+        np.where(birth_dates[:, None] == birth_dates[None, :], 1.0, np.where(years[:, None] == years[None, :], 0.5, 0.0)),
+        0.5,
+    )
+
+    phones = records.phones[members]
+    phone_known = (phones[:, None] != 0) & (phones[None, :] != 0)
+    phone = np.where(phone_known, (phones[:, None] == phones[None, :]).astype(float), 0.5)
+
+    score = (
+        duplicate_setting("NAME_WEIGHT") * name
+        + duplicate_setting("BIRTH_DATE_WEIGHT") * birth_date
+        + duplicate_setting("PHONE_WEIGHT") * phone
+    )
+    genders = records.genders[members]
+    score[(genders[:, None] != genders[None, :]) & (genders[:, None] != 0) & (genders[None, :] != 0)] = 0
+
+    first, second = np.nonzero(np.triu(score >= threshold, k=1))
+    return records.ids[members[first]], records.ids[members[second]], score[first, second]
+
+
+def _windows(records, members, size):
+    """
+    Split an oversized block into overlapping windows of similar names
+    (sorted neighbourhood), so its cost stays linear in its size.
+    """
+    if len(members) <= size:
+        yield members
+        return
+    members = sorted(members, key=lambda m: records.names[m])
+    for start in range(0, len(members) - size // 2, size // 2):
+        yield members[start:start + size]
+
+
+def find_duplicates(threshold=None, progress=None):
+    """
+    Score candidate pairs among all patients (active or pending). Returns
+    (patient_id, duplicate_id, score) triples with patient_id < duplicate_id,
+    and the number of pairs compared.
+    """
+    threshold = duplicate_setting("THRESHOLD") if threshold is None else threshold
+    max_block_size = duplicate_setting("MAX_BLOCK_SIZE")
+
+    rows = (
+        User.objects.filter(role="patient")
+        .values_list("id", "first_name", "middle_name", "last_name", "date_of_birth", "phone_number", "gender",
+                     "patient_profile__kebele")
+        .iterator(chunk_size=5000)
+    )
+    records = PatientRecords(rows)
+
+    found, compared = [], 0
+    blocks = [members for members in records.blocks.values() if len(members) > 1]
+    for done, members in enumerate(blocks, start=1):
+        for window in _windows(records, members, max_block_size):
+            compared += len(window) * (len(window) - 1) // 2
+            found.append(score_block(records, window, threshold))
+        if progress and done % 10000 == 0:
+            progress(done, len(blocks))
+
+    if not found:
+        return [], compared
+    first, second, scores = (np.concatenate(column) for column in zip(*found))
+    low, high = np.minimum(first, second), np.maximum(first, second)
+
+    # A pair sharing both blocking keys is scored twice: keep one
+    order = np.lexsort((-scores, high, low))
+    low, high, scores = low[order], high[order], scores[order]
+    keep = np.ones(len(low), dtype=bool)
+    keep[1:] = (low[1:] != low[:-1]) | (high[1:] != high[:-1])
+    pairs = list(zip(low[keep].tolist(), high[keep].tolist(), scores[keep].round(4).tolist()))
+    return pairs, compared
+
+
+def save_candidates(pairs):
+    """
+    Queue new pairs and refresh the score of known ones; resolved pairs keep
+    their status.
+    """
+    with transaction.atomic():
+        DuplicateCandidate.objects.bulk_create(
+            [DuplicateCandidate(patient_id=a, duplicate_id=b, score=score) for a, b, score in pairs],
+            batch_size=2000,
+            update_conflicts=True,
+            unique_fields=["patient", "duplicate"],
+            update_fields=["score"],
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, Greatest, Least
+
+from patients.models import ChatMessage
+
+
+class Command(BaseCommand):
+    help = "Fill ChatMessage.conversation for messages stored before the field existed."
+
+    def handle(self, *args, **options):
+        # Same value as patients.models.conversation_key(sender_id, receiver_id)
+        updated = ChatMessage.objects.filter(conversation="").update(
+            conversation=Concat(
+                Cast(Least("sender_id", "receiver_id"), CharField()),
+                Value("_"),
+                Cast(Greatest("sender_id", "receiver_id"), CharField()),
+            )
+        )
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} chat messages"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from patients.duplicates import duplicate_setting, find_duplicates, save_candidates
+
+
+class Command(BaseCommand):
+    help = "Find likely duplicate patient registrations and queue them for record officers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threshold", type=float, default=None,
+                            help=f"Minimum score to queue a pair (default {duplicate_setting('THRESHOLD')})")
+        parser.add_argument("--dry-run", action="store_true", help="Report the pairs without queueing them")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        pairs, compared = find_duplicates(
+            threshold=options["threshold"],
+            progress=lambda done, total: self.stdout.write(f"blocks scored: {done}/{total}"),
+        )
+
+        if options["dry_run"]:
+            for patient_id, duplicate_id, score in sorted(pairs, key=lambda pair: -pair[2]):
+                self.stdout.write(f"{patient_id}\t{duplicate_id}\t{score:.3f}")
+        else:
+            save_candidates(pairs)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(pairs)} candidate pairs from {compared} comparisons in {time.monotonic() - started:.1f}s"
+        ))
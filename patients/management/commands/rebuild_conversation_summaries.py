@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from patients.conversations import rebuild_conversation_summaries
+
+
+class Command(BaseCommand):
+    help = "Create or refresh the chat conversation summaries from the stored chat messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Summaries written per statement")
+
+    def handle(self, *args, **options):
+        total = rebuild_conversation_summaries(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} conversation summaries"))
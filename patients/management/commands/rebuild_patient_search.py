@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.search import rebuild_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text patient search index (SQLite FTS5, trigram tokenizer)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Patients indexed per statement batch")
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError("The patient search index needs SQLite; other databases search without it.")
+
+        total = rebuild_index(
+            chunk_size=options["chunk_size"],
+            progress=lambda done: self.stdout.write(f"indexed {done} patients"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} patients"))
@@ -29,12 +29,77 @@ class PatientReferral(models.Model):
     def __str__(self):
         return f"Referral: {self.patient.username} -> {self.referred_to.username} ({self.created_at})"
 
+def conversation_key(user_id, other_id):
+    """
+    Key shared by both directions of a conversation between two users.
+    """
+    return f"{min(user_id, other_id)}_{max(user_id, other_id)}"
+
 # Chat Message Model
 class ChatMessage(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_messages")
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="received_messages")
+    conversation = models.CharField(max_length=50, editable=False)  # conversation_key(sender, receiver)
     message = models.TextField()
     timestamp = models.DateTimeField(default=now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation", "id"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        # bulk_create skips save(), callers using it set conversation themselves
+        if not self.conversation:
+            self.conversation = conversation_key(self.sender_id, self.receiver_id)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Message from {self.sender.username} to {self.receiver.username} at {self.timestamp}"
+
+# One row per participant of each conversation, kept up to date by
+# patients.conversations when chat messages are stored
+class ConversationSummary(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations")
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message = models.TextField()
+    last_message_at = models.DateTimeField()
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "peer"], name="unique_conversation_summary"),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "-last_message_at"]),
+        ]
+
+    def __str__(self):
+        return f"Conversation of {self.owner_id} with {self.peer_id} ({self.unread_count} unread)"
+
+# Possible duplicate registrations found by patients.duplicates, reviewed by
+# record officers. Each pair is stored once, with patient_id < duplicate_id.
+class DuplicateCandidate(models.Model):
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('confirmed', 'Confirmed'),
+        ('dismissed', 'Dismissed'),
+    ]
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    duplicate = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    created_at = models.DateTimeField(default=now)
+    resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "duplicate"], name="unique_duplicate_candidate"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "-score"]),
+        ]
+
     def __str__(self):
-        return f"Message from {self.sender.username} to {self.receiver.username} at {self.timestamp}"
\ No newline at end of file
+        return f"Possible duplicate: {self.patient_id} / {self.duplicate_id} ({self.score:.2f}, {self.status})"
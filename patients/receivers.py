@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.models import PatientProfile, User
+from .search import index_patients, remove_patients
+
+# Connected from PatientsConfig.ready(). Bulk writes that skip signals
+# (users.importer) index their rows themselves.
+
+# Fields that feed the search documents (search.SEARCH_FIELDS)
+INDEXED_USER_FIELDS = {"username", "first_name", "middle_name", "last_name", "phone_number", "ssn", "email", "role"}
+INDEXED_PROFILE_FIELDS = {"region", "town", "kebele", "user"}
+
+
+def _touches(update_fields, indexed):
+    # A save without update_fields may have changed anything
+    return update_fields is None or not indexed.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, created, update_fields=None, **kwargs):
+    if not _touches(update_fields, INDEXED_USER_FIELDS):
+        return  # e.g. last_login on every login, is_active on approval
+    if instance.role == "patient":
+        index_patients([instance.pk])
+    elif not created:
+        remove_patients([instance.pk])  # In case the role changed away from patient
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    remove_patients([instance.pk])
+
+
+@receiver(post_save, sender=PatientProfile)
+def index_saved_profile(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, INDEXED_PROFILE_FIELDS):
+        index_patients([instance.user_id])
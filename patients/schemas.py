@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from users.schemas import PatientProfileOut, UserOut
 
@@ -98,3 +98,7 @@ class ChatMessageOut(BaseModel):
 class RoomAssignmentSchema(BaseModel):
     patient_id: int
     room_number: str
+
+# Schema for Resolving a Possible Duplicate Registration
+class DuplicateResolvePayload(BaseModel):
+    action: Literal["confirm", "dismiss"]
@@ -0,0 +1,177 @@
+import itertools
+import re
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import Q
+from users.models import User
+
+# SQLite FTS5 table with the trigram tokenizer: every column matches on any
+# substring of three characters or more. rowid is the patient's user id.
+SEARCH_TABLE = "patient_search"
+CREATE_SEARCH_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+    "USING fts5(name, contact, location, tokenize='trigram')"
+)
+# bm25 column weights: a name hit outranks a contact hit outranks a location hit
+RANK = f"bm25({SEARCH_TABLE}, 10.0, 5.0, 2.0)"
+
+MIN_TERM_LENGTH = 3
+
+SEARCH_FIELDS = [
+    "id", "username", "first_name", "middle_name", "last_name", "phone_number", "ssn", "email", "is_active",
+    "patient_profile__region", "patient_profile__town", "patient_profile__kebele",
+]
+
+
+def search_enabled():
+    return connection.vendor == "sqlite"
+
+
+_table_ready = False
+
+
+def _ensure_table(cursor):
+    # Once per process: created on migrate (create_search_index), this only
+    # covers databases migrated before the index existed
+    global _table_ready
+    if not _table_ready:
+        cursor.execute(CREATE_SEARCH_TABLE)
+        _table_ready = True
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate handler (PatientsConfig.ready): create the index and fill it
+    with the existing patients if it does not exist yet, so a new deployment
+    does not need a rebuild_patient_search run before search finds anyone.
+    """
+    if using != DEFAULT_DB_ALIAS or not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [SEARCH_TABLE])
+        exists = cursor.fetchone() is not None
+    if not exists:
+        rebuild_index()
+
+
+def _documents(users):
+    rows = users.filter(role="patient").values_list(*SEARCH_FIELDS)
+    for (user_id, username, first, middle, last, phone, ssn, email, _,
+         region, town, kebele) in rows.iterator(chunk_size=2000):
+        # Digits-only / alphanumeric-only forms match however staff type them
+        compact = [re.sub(r"\D", "", phone or ""), re.sub(r"\W", "", ssn or "")]
+        yield (
+            user_id,
+            " ".join(filter(None, [first, middle, last, username])),
+            " ".join(filter(None, [phone, ssn, email, *compact])),
+            " ".join(filter(None, [region, town, kebele])),
+        )
+
+
+INSERT_DOCUMENT = f"INSERT INTO {SEARCH_TABLE} (rowid, name, contact, location) VALUES (%s, %s, %s, %s)"
+
+
+def index_patients(user_ids):
+    """
+    (Re)index the given users; ids that are not patients are dropped from the index.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        _ensure_table(cursor)
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+            )
+            cursor.executemany(INSERT_DOCUMENT, list(_documents(User.objects.filter(id__in=chunk))))
+
+
+def remove_patients(user_ids):
+    user_ids = list(user_ids)
+    if not user_ids or not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        _ensure_table(cursor)
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(user_ids))})", user_ids
+        )
+
+
+def rebuild_index(chunk_size=2000, progress=None):
+    """
+    Drop and rebuild the whole index. Returns the number of patients indexed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+        cursor.execute(CREATE_SEARCH_TABLE)
+
+        total = 0
+        documents = _documents(User.objects.order_by("id"))
+        while True:
+            batch = list(itertools.islice(documents, chunk_size))
+            if not batch:
+                break
+            cursor.executemany(INSERT_DOCUMENT, batch)
+            total += len(batch)
+            if progress:
+                progress(total)
+
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def search_terms(query):
+    return [term for term in re.findall(r"\w+", query.lower()) if len(term) >= MIN_TERM_LENGTH]
+
+
+def _match_expressions(terms):
+    """
+    Strict expression (every term appears as a substring) and fuzzy one
+    (any trigram of any term; bm25 favours rows sharing more trigrams, which
+    tolerates typos).
+    """
+    strict = " AND ".join(f'"{term}"' for term in terms)
+    trigrams = dict.fromkeys(term[i:i + 3] for term in terms for i in range(len(term) - 2))
+    fuzzy = " OR ".join(f'"{trigram}"' for trigram in trigrams)
+    return strict, fuzzy
+
+
+def _ranked_ids(cursor, expression, limit, offset):
+    cursor.execute(
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY {RANK} LIMIT %s OFFSET %s",
+        [expression, limit, offset],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def search_patients(query, limit=20, offset=0):
+    """
+    Ranked patient ids for a free-text query and whether the fuzzy fallback
+    was used. Exact substring matches are returned when there are any;
+    otherwise the trigram-overlap ranking is.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+
+    if not search_enabled():
+        # Other databases: unranked substring match on the same fields
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(first_name__icontains=term) | Q(middle_name__icontains=term) | Q(last_name__icontains=term)
+                | Q(username__icontains=term) | Q(phone_number__icontains=term) | Q(ssn__icontains=term)
+                | Q(email__icontains=term) | Q(patient_profile__region__icontains=term)
+                | Q(patient_profile__town__icontains=term) | Q(patient_profile__kebele__icontains=term)
+            )
+        ids = User.objects.filter(condition, role="patient").order_by("id").values_list("id", flat=True)
+        return list(ids[offset:offset + limit]), False
+
+    strict, fuzzy = _match_expressions(terms)
+    with connection.cursor() as cursor:
+        _ensure_table(cursor)
+        cursor.execute(f"SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT 1", [strict])
+        if cursor.fetchone():
+            return _ranked_ids(cursor, strict, limit, offset), False
+        return _ranked_ids(cursor, fuzzy, limit, offset), True
@@ -7,14 +7,16 @@ from pharmacy.models import Prescription
 from billings.models import Invoice
 from .schemas import (
     PatientProfileOut, MedicalHistoryOut, BillingHistoryOut, RoomAssignmentSchema, AppointmentOut, LabTestOut, PrescriptionOut,
-    InvoiceOut, PatientCommentCreate, PatientReferralCreate, PatientReferralOut, ChatMessageCreate,  UserOut
+    InvoiceOut, PatientCommentCreate, PatientReferralCreate, PatientReferralOut, ChatMessageCreate,  UserOut,
+    DuplicateResolvePayload
 )
 from users.auth import AuthBearer, AsyncAuthBearer  
 from notifications.models import Notification
 from notifications.schemas import NotificationOut
 from notifications.views import send_notification
 from notifications.utils import send_notification_to_user
-from .models import PatientComment, PatientReferral, ChatMessage
+from .models import PatientComment, PatientReferral, ChatMessage, ConversationSummary, DuplicateCandidate, conversation_key
+from .search import SEARCH_FIELDS, search_patients, search_terms
 from users.models import User, PatientProfile
 import pdfkit  
 from django.utils.timezone import now
@@ -185,34 +187,194 @@ def assign_room(request, payload: RoomAssignmentSchema):
 
 
 # Get Chat History
-@patients_router.get("/chat/history", response={200: list[dict]}, auth=AuthBearer())
-def get_chat_history(request, receiver_id: int):
+@patients_router.get("/chat/history", response={200: list[dict], 400: dict}, auth=AuthBearer())
+def get_chat_history(request, receiver_id: int, before_id: int = None, limit: int = 50):
+    """
+    One page of a conversation, oldest first. Pass the id of the first message
+    received as before_id to load the page before it.
+    """
     user = request.auth
     if user.role not in ['patient', 'doctor']:
         return 401, {"message": "Unauthorized"}
 
+    if not 1 <= limit <= 200:
+        return 400, {"error": "limit must be between 1 and 200"}
+
     receiver = get_object_or_404(User, id=receiver_id)
 
-    messages = ChatMessage.objects.filter(
-        (models.Q(sender=user) & models.Q(receiver=receiver)) |
-        (models.Q(sender=receiver) & models.Q(receiver=user))
-    ).order_by("timestamp")
+    messages = ChatMessage.objects.filter(conversation=conversation_key(user.id, receiver.id))
+    if before_id is not None:
+        messages = messages.filter(id__lt=before_id)
+
+    # Newest page first on the (conversation, id) index, usernames joined in the same query
+    page = messages.order_by("-id").values(
+        "id", "message", "timestamp",
+        sender_username=models.F("sender__username"),
+        receiver_username=models.F("receiver__username"),
+    )[:limit]
 
     serialized_messages = [
         {
-            "id": msg.id,
-            "sender": msg.sender.username,  
-            "receiver": msg.receiver.username,  
-            "message": msg.message,
-            "timestamp": msg.timestamp,
+            "id": msg["id"],
+            "sender": msg["sender_username"],
+            "receiver": msg["receiver_username"],
+            "message": msg["message"],
+            "timestamp": msg["timestamp"],
         }
-        for msg in messages
+        for msg in reversed(list(page))
     ]
 
     return serialized_messages
 
 
 
+# Inbox: one row per conversation, newest first
+@patients_router.get("/chat/inbox", response={200: list[dict], 400: dict}, auth=AuthBearer())
+def get_chat_inbox(request, limit: int = 50):
+    user = request.auth
+    if user.role not in ['patient', 'doctor']:
+        return 401, {"message": "Unauthorized"}
+
+    if not 1 <= limit <= 200:
+        return 400, {"error": "limit must be between 1 and 200"}
+
+    conversations = ConversationSummary.objects.filter(owner=user).order_by("-last_message_at").values(
+        "peer_id", "last_message", "last_message_at", "unread_count",
+        peer_username=models.F("peer__username"),
+    )[:limit]
+
+    return [
+        {
+            "peer_id": c["peer_id"],
+            "peer": c["peer_username"],
+            "last_message": c["last_message"],
+            "last_message_at": c["last_message_at"],
+            "unread_count": c["unread_count"],
+        }
+        for c in conversations
+    ]
+
+
+# Mark a Conversation as Read
+@patients_router.put("/chat/{peer_id}/mark-read", response={200: dict}, auth=AuthBearer())
+def mark_conversation_read(request, peer_id: int):
+    user = request.auth
+    ConversationSummary.objects.filter(owner=user, peer_id=peer_id).update(unread_count=0)
+    return {"message": "Conversation marked as read"}
+
+
+# Search Patients (name, phone, SSN, email, region/town/kebele)
+@patients_router.get("/search", response={200: dict, 400: dict}, auth=AuthBearer())
+def search_patient_records(request, q: str, limit: int = 20, offset: int = 0):
+    """
+    Ranked patient search: substring matches on any field of three or more
+    characters, falling back to typo-tolerant trigram ranking ("fuzzy": true).
+    """
+    if request.auth.role not in ["manager", "record_officer"]:
+        return 400, {"error": "Only managers/record_officers can search patient records"}
+
+    if not 1 <= limit <= 100 or offset < 0:
+        return 400, {"error": "limit must be between 1 and 100 and offset not negative"}
+
+    if not search_terms(q):
+        return 400, {"error": "Search terms need at least 3 characters"}
+
+    ids, fuzzy = search_patients(q, limit=limit, offset=offset)
+    rows = {row["id"]: row for row in User.objects.filter(id__in=ids).values(*SEARCH_FIELDS)}
+
+    results = [
+        {
+            "user_id": user_id,
+            "username": rows[user_id]["username"],
+            "first_name": rows[user_id]["first_name"],
+            "middle_name": rows[user_id]["middle_name"],
+            "last_name": rows[user_id]["last_name"],
+            "phone_number": rows[user_id]["phone_number"],
+            "ssn": rows[user_id]["ssn"],
+            "email": rows[user_id]["email"],
+            "is_active": rows[user_id]["is_active"],
+            "region": rows[user_id]["patient_profile__region"],
+            "town": rows[user_id]["patient_profile__town"],
+            "kebele": rows[user_id]["patient_profile__kebele"],
+        }
+        for user_id in ids
+        if user_id in rows
+    ]
+
+    return {
+        "results": results,
+        "fuzzy": fuzzy,
+        "next_offset": offset + limit if len(ids) == limit else None,
+    }
+
+
+# Possible Duplicate Registrations (found by the find_duplicate_patients job)
+DUPLICATE_FIELDS = ["id", "username", "first_name", "middle_name", "last_name", "date_of_birth", "phone_number", "ssn",
+                    "gender", "is_active", "patient_profile__kebele"]
+
+
+@patients_router.get("/duplicates", response={200: dict, 400: dict}, auth=AuthBearer())
+def get_duplicate_candidates(request, status: str = "pending", limit: int = 50, offset: int = 0):
+    """
+    Review queue of possible duplicate patients, most likely first, with both
+    records side by side.
+    """
+    if request.auth.role not in ["manager", "record_officer"]:
+        return 400, {"error": "Only managers/record_officers can review duplicate patients"}
+
+    if status not in dict(DuplicateCandidate.STATUSES):
+        return 400, {"error": "status must be pending, confirmed or dismissed"}
+
+    if not 1 <= limit <= 200 or offset < 0:
+        return 400, {"error": "limit must be between 1 and 200 and offset not negative"}
+
+    candidates = list(
+        DuplicateCandidate.objects.filter(status=status).order_by("-score", "id")
+        .values("id", "patient_id", "duplicate_id", "score", "status", "resolved_at")[offset:offset + limit]
+    )
+    user_ids = {c["patient_id"] for c in candidates} | {c["duplicate_id"] for c in candidates}
+    records = {row["id"]: row for row in User.objects.filter(id__in=user_ids).values(*DUPLICATE_FIELDS)}
+
+    def record(user_id):
+        row = dict(records[user_id])
+        row["kebele"] = row.pop("patient_profile__kebele")
+        return row
+
+    return {
+        "results": [
+            {
+                "id": c["id"],
+                "score": c["score"],
+                "status": c["status"],
+                "resolved_at": c["resolved_at"],
+                "patient": record(c["patient_id"]),
+                "duplicate": record(c["duplicate_id"]),
+            }
+            for c in candidates
+        ],
+        "next_offset": offset + limit if len(candidates) == limit else None,
+    }
+
+
+# Resolve a Possible Duplicate
+@patients_router.put("/duplicates/{candidate_id}", response={200: dict, 400: dict}, auth=AuthBearer())
+def resolve_duplicate_candidate(request, candidate_id: int, payload: DuplicateResolvePayload):
+    """
+    Confirm the pair as the same person or dismiss it. Dismissed pairs are
+    not queued again by later runs.
+    """
+    if request.auth.role not in ["manager", "record_officer"]:
+        return 400, {"error": "Only managers/record_officers can review duplicate patients"}
+
+    candidate = get_object_or_404(DuplicateCandidate, id=candidate_id)
+    candidate.status = "confirmed" if payload.action == "confirm" else "dismissed"
+    candidate.resolved_by = request.auth
+    candidate.resolved_at = now()
+    candidate.save(update_fields=["status", "resolved_by", "resolved_at"])
+
+    return {"message": f"Duplicate candidate {candidate.status}", "id": candidate.id}
+
+
 @patients_router.get("/user/patient-records/", response={200: list[PatientProfileOut], 400: dict}, auth=AuthBearer())
 def get_patient_records(request):
     sender = request.auth
@@ -8,7 +8,7 @@ from .schemas import (
     DrugCreate, DrugUpdate, DrugOut
 )
 from users.auth import AuthBearer, AsyncAuthBearer 
-from notifications.utils import send_notification_to_user 
+from notifications.utils import send_notification_to_user, send_notification_to_role
 
 pharmacy_router = Router(tags=["Pharmacy"])
 
@@ -33,9 +33,7 @@ def prescribe_medication(request, payload: PrescriptionCreate):
     )
 
     # Notify all pharmacists about the new prescription
-    pharmacists = User.objects.filter(role="pharmacist")
-    for pharmacist in pharmacists:
-        send_notification_to_user(pharmacist, f"New prescription for {patient.username}: {payload.medication_name}.")
+    send_notification_to_role("pharmacist", f"New prescription for {patient.username}: {payload.medication_name}.")
 
     return {
         "id": prescription.id,
@@ -1,8 +1,36 @@
+from asgiref.sync import sync_to_async
 from ninja_jwt.authentication import JWTAuth, AsyncJWTAuth
+from ninja_jwt.exceptions import TokenError
+from ninja_jwt.tokens import AccessToken
 from django.http import HttpRequest
+from .models import User
+from .tokencache import token_cache
+
+
+class CachedTokenMixin:
+    """
+    Skip JWT verification and the user query for tokens found in token_cache.
+    """
+
+    def jwt_authenticate(self, request: HttpRequest, token: str):
+        user = token_cache.get(token)
+        if user is None:
+            validated_token = self.get_validated_token(token)
+            user = self.get_user(validated_token)
+            token_cache.put(token, user, validated_token["exp"])
+        request.user = user
+        return user
+
+    async def async_jwt_authenticate(self, request: HttpRequest, token: str):
+        user = token_cache.get(token)
+        if user is None:
+            return await sync_to_async(self.jwt_authenticate)(request, token)
+        request.user = user
+        return user
+
 
 # Sync Auth with cookie-based token retrieval
-class AuthBearer(JWTAuth):
+class AuthBearer(CachedTokenMixin, JWTAuth):
     def get_authorization(self, request: HttpRequest):
         # Look for the token in cookies instead of headers
         token = request.COOKIES.get('access_token')
@@ -10,8 +38,29 @@ class AuthBearer(JWTAuth):
 
 
 # Async Auth with cookie-based token retrieval
-class AsyncAuthBearer(AsyncJWTAuth):
+class AsyncAuthBearer(CachedTokenMixin, AsyncJWTAuth):
     async def get_authorization(self, request: HttpRequest):
         # Look for the token in cookies instead of headers
         token = request.COOKIES.get('access_token')
         return token
+
+
+async def get_user_from_token(token):
+    """
+    Resolve a raw access token (e.g. from a WebSocket query string) to its user.
+    Returns None if the token is invalid or the user no longer exists or is inactive.
+    """
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    try:
+        validated_token = AccessToken(token)
+    except TokenError:
+        return None
+
+    user = await User.objects.filter(id=validated_token["user_id"]).afirst()
+    if user is None or not user.is_active:  # HTTP auth refuses inactive users
+        return None
+    token_cache.put(token, user, validated_token["exp"])
+    return user
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from contextlib import suppress
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.timezone import now
+from ninja_jwt.settings import api_settings
+from ninja_jwt.token_blacklist.models import BlacklistedToken
+from ninja_jwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_FILTER_DEFAULTS = {
+    "CAPACITY": 100000,       # blacklisted tokens the Bloom filter is sized for (grows past it)
+    "ERROR_RATE": 0.01,       # false positive rate at capacity
+    "SYNC_INTERVAL": 5,       # seconds between picking up tokens blacklisted by other processes
+    "REBUILD_INTERVAL": 3600, # seconds between full rebuilds, which drop expired tokens
+    "SYNC_OVERLAP": 60,       # seconds each sync reaches back, for slow commits and clock skew between processes
+    "MAX_STALENESS": 20,      # seconds without a successful refresh before lookups fall back to the DB
+}
+
+
+def blacklist_filter_setting(name):
+    return getattr(settings, "TOKEN_BLACKLIST_FILTER", {}).get(name, BLACKLIST_FILTER_DEFAULTS[name])
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings (double hashing on one blake2b digest).
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """
+    In-memory set of blacklisted refresh-token JTIs behind a Bloom filter, so
+    refreshing a token that was never blacklisted does not touch the
+    blacklist tables. Only JTIs found in both are confirmed against the DB.
+
+    Built on startup, updated in-process by users.receivers when a token is
+    blacklisted and synced every SYNC_INTERVAL with tokens blacklisted by
+    other processes (by blacklisted_at, reaching SYNC_OVERLAP back so rows
+    committed late are not missed). It fails closed: until the first build,
+    after a failed refresh and whenever the last successful one is older
+    than MAX_STALENESS, every lookup falls through to the DB.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = set()
+        self._added = set()  # Added in-process since the last rebuild started
+        self._bloom = None
+        self._synced_until = None  # blacklisted_at the next sync reads from (less the overlap)
+        self._refreshed_at = None  # time.monotonic() of the last successful build or sync
+        self._task = None
+        self._loop = None
+
+    def might_contain(self, jti) -> bool:
+        with self._lock:
+            if self._bloom is None or time.monotonic() - self._refreshed_at > blacklist_filter_setting("MAX_STALENESS"):
+                return True
+            if jti not in self._bloom:
+                return False
+            return jti in self._jtis
+
+    def add(self, jti):
+        with self._lock:
+            self._added.add(jti)
+            if self._bloom is None or jti in self._jtis:
+                return
+            self._jtis.add(jti)
+            self._bloom.add(jti)
+            if self._bloom.count > self._bloom.capacity:
+                self._bloom = self._build_bloom(self._jtis)
+
+    def _build_bloom(self, jtis):
+        capacity = blacklist_filter_setting("CAPACITY")
+        while capacity < len(jtis) * 2:
+            capacity *= 2
+        bloom = BloomFilter(capacity, blacklist_filter_setting("ERROR_RATE"))
+        for jti in jtis:
+            bloom.add(jti)
+        return bloom
+
+    def invalidate(self):
+        """
+        Drop the filter so lookups go to the DB until the next rebuild.
+        """
+        with self._lock:
+            self._bloom = None
+
+    def rebuild(self):
+        """
+        Load every blacklisted token that has not expired yet.
+        """
+        with self._lock:
+            self._added = set()
+        started, refreshed_at = now(), time.monotonic()
+        jtis = set(
+            BlacklistedToken.objects.filter(token__expires_at__gt=started)
+            .values_list("token__jti", flat=True)
+            .iterator(chunk_size=5000)
+        )
+        bloom = self._build_bloom(jtis)
+        with self._lock:
+            # Keep what was added in-process while the rows were loading
+            for jti in self._added - jtis:
+                jtis.add(jti)
+                bloom.add(jti)
+            self._jtis, self._bloom = jtis, bloom
+            self._synced_until, self._refreshed_at = started, refreshed_at
+
+    def sync(self):
+        """
+        Pick up tokens blacklisted since the last build or sync. Tokens
+        already known are skipped, so the overlap only costs a re-read.
+        """
+        started, refreshed_at = now(), time.monotonic()
+        since = self._synced_until - timedelta(seconds=blacklist_filter_setting("SYNC_OVERLAP"))
+        jtis = list(BlacklistedToken.objects.filter(blacklisted_at__gte=since).values_list("token__jti", flat=True))
+        for jti in jtis:
+            self.add(jti)
+        with self._lock:
+            self._synced_until, self._refreshed_at = started, refreshed_at
+        return len(jtis)
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+        self._loop = None
+
+    async def _run(self):
+        last_rebuild = None
+        while True:
+            try:
+                if last_rebuild is None or time.monotonic() - last_rebuild > blacklist_filter_setting("REBUILD_INTERVAL"):
+                    await sync_to_async(self.rebuild)()
+                    last_rebuild = time.monotonic()
+                else:
+                    await sync_to_async(self.sync)()
+            except Exception:
+                logger.exception("Token blacklist filter refresh failed, checking the DB until it is rebuilt")
+                self.invalidate()
+                last_rebuild = None
+            await asyncio.sleep(blacklist_filter_setting("SYNC_INTERVAL"))
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    RefreshToken that only queries the blacklist for JTIs blacklist_filter
+    cannot rule out.
+    """
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
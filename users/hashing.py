@@ -0,0 +1,83 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+PASSWORD_HASHING_DEFAULTS = {
+    "MAX_WORKERS": 4,    # threads hashing passwords at the same time
+    "MAX_PENDING": 32,   # running + queued hashes before logins are turned away
+}
+
+
+def password_hashing_setting(name):
+    return getattr(settings, "PASSWORD_HASHING", {}).get(name, PASSWORD_HASHING_DEFAULTS[name])
+
+
+def init_hashing_process(settings_module):
+    """
+    ProcessPoolExecutor initializer: spawned workers start from a bare
+    interpreter. Kept free of model imports so the workers can unpickle it.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+class HashingSaturated(Exception):
+    """
+    Raised when the password executor already has MAX_PENDING jobs.
+    """
+
+
+def verify_password(raw_password, encoded):
+    """
+    Check a password against its stored hash. Returns (is_correct, new_hash),
+    new_hash being set when the hasher or its parameters changed since the
+    hash was stored. With no stored hash the default hasher still runs once,
+    so unknown usernames take as long as wrong passwords.
+    """
+    if encoded is None:
+        make_password(raw_password)
+        return False, None
+
+    rehashed = []
+    is_correct = check_password(raw_password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return is_correct, (rehashed[0] if rehashed else None)
+
+
+class PasswordHashingExecutor:
+    """
+    Small dedicated thread pool for password hashing, so a burst of logins
+    cannot take every thread sync views run on. Once MAX_PENDING hashes are
+    running or queued, new ones fail fast with HashingSaturated.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=password_hashing_setting("MAX_WORKERS"),
+                thread_name_prefix="password-hashing",
+            )
+        return self._executor
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= password_hashing_setting("MAX_PENDING"):
+                raise HashingSaturated()
+            self.pending += 1
+            executor = self._get_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+password_executor = PasswordHashingExecutor()
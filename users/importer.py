@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+from pydantic import ValidationError
+from patients.search import index_patients
+from .hashing import init_hashing_process
+from .models import PatientProfile, User
+from .schemas import SignupSchema
+
+PATIENT_IMPORT_DEFAULTS = {
+    "MAX_UPLOAD_BYTES": 1024 * 1024,  # larger uploads to the import endpoint are refused
+    "MAX_UPLOAD_ROWS": 200,           # rows one request may import (passwords are hashed inline)
+}
+
+
+def patient_import_setting(name):
+    return getattr(settings, "PATIENT_IMPORT", {}).get(name, PATIENT_IMPORT_DEFAULTS[name])
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (row number, dict or error message) from a CSV (with header) or
+    JSONL text stream. Row numbers count data rows from 1.
+    """
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, {key: value for key, value in row.items() if key is not None}
+    elif fmt == "jsonl":
+        number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, f"Invalid JSON: {e}"
+                continue
+            yield number, row if isinstance(row, dict) else "Expected a JSON object"
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def open_text(uploaded):
+    """
+    Text stream over an uploaded or opened binary file, decoded as UTF-8.
+    """
+    return io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")
+
+
+class PatientImporter:
+    """
+    Bulk version of signup for migrating paper registries: rows are
+    validated with SignupSchema, passwords are hashed (across a process pool
+    when workers > 1) and each batch of User and PatientProfile rows is
+    inserted in one transaction. Rows that fail are reported with their row number and
+    skipped; next_offset lets an interrupted import resume.
+    """
+
+    def __init__(self, batch_size=500, workers=1, active=True):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.active = active
+        self.imported = 0
+        self.errors = []  # {"row": n, "errors": [...]}
+        self.next_offset = 0
+        self._pool = None
+
+    def report(self):
+        return {
+            "imported": self.imported,
+            "failed": len(self.errors),
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+            "next_offset": self.next_offset,
+        }
+
+    def run(self, rows, offset=0, progress=None):
+        """
+        Import (row number, row) pairs, skipping the first `offset` rows.
+        progress(report) is called after every committed batch.
+        """
+        self.next_offset = offset
+        batch = []
+        try:
+            for number, row in rows:
+                if number <= offset:
+                    continue
+                batch.append((number, row))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch)
+                    batch = []
+                    if progress:
+                        progress(self.report())
+            if batch:
+                self._import_batch(batch)
+                if progress:
+                    progress(self.report())
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        return self.report()
+
+    def _fail(self, number, errors):
+        self.errors.append({"row": number, "errors": errors})
+
+    def _validate(self, batch):
+        valid = []
+        for number, row in batch:
+            if isinstance(row, str):
+                self._fail(number, [row])
+                continue
+            try:
+                payload = SignupSchema.model_validate(row)
+            except ValidationError as e:
+                self._fail(number, [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()])
+                continue
+            if parse_date(payload.date_of_birth) is None:
+                self._fail(number, ["date_of_birth: expected YYYY-MM-DD"])
+                continue
+            valid.append((number, payload))
+        return valid
+
+    def _drop_duplicates(self, valid):
+        # Unique fields already taken in the DB or earlier in this batch
+        taken = {
+            field: set(User.objects.filter(**{f"{field}__in": [getattr(p, field) for _, p in valid]})
+                       .values_list(field, flat=True))
+            for field in ("username", "email", "ssn")
+        }
+        unique = []
+        for number, payload in valid:
+            clashes = [f"{field}: already exists" for field in taken if getattr(payload, field) in taken[field]]
+            if clashes:
+                self._fail(number, clashes)
+                continue
+            for field in taken:
+                taken[field].add(getattr(payload, field))
+            unique.append((number, payload))
+        return unique
+
+    def _hash_passwords(self, passwords):
+        if self.workers <= 1 or len(passwords) < 2:
+            return [make_password(p) for p in passwords]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_hashing_process,
+                initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "HospitalManagmentSystem.settings"),),
+            )
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._pool.map(make_password, passwords, chunksize=chunksize))
+
+    def _build(self, payload, password_hash):
+        user = User(
+            username=payload.username,
+            password=password_hash,
+            email=payload.email,
+            first_name=payload.first_name,
+            middle_name=payload.middle_name,
+            last_name=payload.last_name,
+            phone_number=payload.phone_number,
+            gender=payload.gender,
+            date_of_birth=parse_date(payload.date_of_birth),
+            address=payload.address,
+            ssn=payload.ssn,
+            role="patient",
+            is_active=self.active,
+        )
+        profile = PatientProfile(
+            region=payload.region,
+            town=payload.town,
+            kebele=payload.kebele,
+            house_number=payload.house_number,
+        )
+        return user, profile
+
+    def _insert(self, pairs):
+        users = User.objects.bulk_create([user for user, _ in pairs])
+        for user, (_, profile) in zip(users, pairs):
+            profile.user = user
+        PatientProfile.objects.bulk_create([profile for _, profile in pairs])
+        # bulk_create skips the signals that keep the search index current
+        index_patients([user.pk for user in users])
+        return users
+
+    def _import_batch(self, batch):
+        valid = self._drop_duplicates(self._validate(batch))
+        if valid:
+            hashes = self._hash_passwords([payload.password for _, payload in valid])
+            rows = [(number, self._build(payload, password_hash))
+                    for (number, payload), password_hash in zip(valid, hashes)]
+            try:
+                with transaction.atomic():
+                    self._insert([pair for _, pair in rows])
+                self.imported += len(rows)
+            except IntegrityError:
+                # A concurrent signup took a username/email/ssn: find the rows one by one
+                for number, (user, profile) in rows:
+                    user.pk = profile.pk = None
+                    try:
+                        with transaction.atomic():
+                            self._insert([(user, profile)])
+                        self.imported += 1
+                    except IntegrityError as e:
+                        self._fail(number, [str(e)])
+        self.next_offset = batch[-1][0]
@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importer import PatientImporter, detect_format, open_text, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk-register patients from a CSV (with header) or JSONL file using the signup fields."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+        parser.add_argument("--offset", type=int, default=0, help="Skip this many data rows (resume an import)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows inserted per transaction")
+        parser.add_argument("--workers", type=int, default=None, help="Password hashing processes (default: CPUs)")
+        parser.add_argument("--pending", action="store_true", help="Import as inactive, awaiting record officer approval")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or detect_format(options["path"])
+        importer = PatientImporter(
+            batch_size=options["batch_size"],
+            workers=options["workers"] or os.cpu_count() or 1,
+            active=not options["pending"],
+        )
+
+        def progress(report):
+            self.stdout.write(f"rows done: {report['next_offset']}, imported: {report['imported']}, failed: {report['failed']}")
+
+        try:
+            with open(options["path"], "rb") as f:
+                report = importer.run(read_rows(open_text(f), fmt), offset=options["offset"], progress=progress)
+        except OSError as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            report = importer.report()
+            self.stderr.write(f"Interrupted, resume with --offset {report['next_offset']}")
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {'; '.join(error['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} patients, {report['failed']} rows failed (next offset {report['next_offset']})"
+        ))
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PICTURE_DEFAULTS = {
+    "THUMBNAIL_SIZE": (128, 128),  # bounding box, aspect ratio is kept
+    "THUMBNAIL_QUALITY": 85,       # JPEG quality
+    "THUMBNAIL_WORKERS": 2,        # background threads generating thumbnails
+}
+
+
+def profile_picture_setting(name):
+    return getattr(settings, "PROFILE_PICTURES", {}).get(name, PROFILE_PICTURE_DEFAULTS[name])
+
+
+_thumbnail_executor = None
+
+
+def _get_thumbnail_executor():
+    global _thumbnail_executor
+    if _thumbnail_executor is None:
+        _thumbnail_executor = ThreadPoolExecutor(
+            max_workers=profile_picture_setting("THUMBNAIL_WORKERS"),
+            thread_name_prefix="thumbnails",
+        )
+    return _thumbnail_executor
+
+
+def store_profile_picture(user, upload):
+    """
+    Stream an uploaded picture into storage under its SHA-256 and queue its
+    thumbnail. Identical uploads share one file. The thumbnail is generated
+    in the background once the surrounding transaction commits.
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+
+    file_ext = os.path.splitext(upload.name or "")[1].lower()
+    name = f"profile_pictures/{digest.hexdigest()}{file_ext}"
+    if not default_storage.exists(name):
+        name = default_storage.save(name, upload)  # Reads the upload chunk by chunk
+
+    user.profile_picture = name
+    user.profile_thumbnail = None
+    user.save(update_fields=["profile_picture", "profile_thumbnail"])
+
+    transaction.on_commit(lambda: _get_thumbnail_executor().submit(generate_thumbnail, user.pk, name))
+    return name
+
+
+def generate_thumbnail(user_id, picture_name):
+    """
+    Write the thumbnail of a stored picture (once per picture) and point the
+    user at it, unless the user changed pictures in the meantime.
+    """
+    from PIL import Image, ImageOps
+
+    close_old_connections()
+    try:
+        stem = os.path.splitext(os.path.basename(picture_name))[0]
+        thumbnail_name = f"profile_pictures/thumbnails/{stem}.jpg"
+
+        if not default_storage.exists(thumbnail_name):
+            with default_storage.open(picture_name, "rb") as source:
+                image = ImageOps.exif_transpose(Image.open(source))
+                image.thumbnail(profile_picture_setting("THUMBNAIL_SIZE"))
+                output = BytesIO()
+                image.convert("RGB").save(output, "JPEG", quality=profile_picture_setting("THUMBNAIL_QUALITY"))
+            thumbnail_name = default_storage.save(thumbnail_name, ContentFile(output.getvalue()))
+
+        User.objects.filter(pk=user_id, profile_picture=picture_name).update(profile_thumbnail=thumbnail_name)
+    except Exception:
+        logger.exception("Could not create a thumbnail for %s", picture_name)
+    finally:
+        close_old_connections()
+
+
+def profile_thumbnail_url(request, user):
+    """
+    Absolute URL of the user's thumbnail, or of the original picture while
+    the thumbnail is not ready yet.
+    """
+    picture = user.profile_thumbnail or user.profile_picture
+    return request.build_absolute_uri(picture.url) if picture else None
+
+
+def media_url_builder(request):
+    """
+    profile_thumbnail_url for values() rows: returns a function mapping
+    stored file names (thumbnail first, then picture) to an absolute URL,
+    resolving the scheme and host once per request.
+    """
+    origin = request.build_absolute_uri("/").rstrip("/")
+
+    def url(*names):
+        name = next((n for n in names if n), None)
+        if name is None:
+            return None
+        path = default_storage.url(name)
+        return path if "://" in path else origin + path
+
+    return url
@@ -27,6 +27,8 @@ class User(AbstractUser):
         null=True, 
         default='profile_pictures/default_profile.png'
     )
+    # Generated in the background by users.media, used by list endpoints
+    profile_thumbnail = models.ImageField(upload_to='profile_pictures/thumbnails/', blank=True, null=True)
 
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
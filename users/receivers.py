@@ -0,0 +1,25 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .blacklist import blacklist_filter
+from .models import User
+from .tokencache import token_cache
+
+# Connected from UsersConfig.ready()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    # Role, activation or profile picture may have changed
+    token_cache.invalidate_user(instance.pk)
+
+
+def token_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        blacklist_filter.add(instance.token.jti)
+    token_cache.invalidate_user(instance.token.user_id)
+
+
+if apps.is_installed("ninja_jwt.token_blacklist"):
+    post_save.connect(token_blacklisted, sender="token_blacklist.BlacklistedToken")
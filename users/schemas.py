@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import Optional
+from typing import Literal, Optional
 from datetime import date
 from ninja import Router, File, Form
 from ninja.files import UploadedFile
@@ -106,4 +106,8 @@ class TokenSchema(BaseModel):
     refresh_token: str
 
 class ApprovePayload(BaseModel):
-    user_id: int
\ No newline at end of file
+    user_id: int
+
+class BulkApprovePayload(BaseModel):
+    user_ids: list[int] = Field(..., min_length=1, max_length=1000)
+    action: Literal["approve", "reject"] = "approve"
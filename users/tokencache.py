@@ -0,0 +1,80 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+TOKEN_CACHE_DEFAULTS = {
+    "MAX_SIZE": 10000,  # verified tokens kept per process
+    "TTL": 60,          # seconds before a token is verified again, even if still valid
+}
+
+
+def token_cache_setting(name):
+    return getattr(settings, "AUTH_TOKEN_CACHE", {}).get(name, TOKEN_CACHE_DEFAULTS[name])
+
+
+class VerifiedTokenCache:
+    """
+    Process-local LRU of access tokens that already passed verification,
+    with the user each one resolved to.
+
+    An entry lives until the token expires or for TTL seconds, whichever is
+    sooner. users.receivers drops a user's entries when the user is saved,
+    deleted or one of their tokens is blacklisted; the TTL bounds how long
+    another process may keep serving a stale user.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Sync views authenticate from worker threads
+        self._entries = OrderedDict()  # token -> (expires_at, user)
+        self._user_tokens = {}         # user id -> tokens cached for that user
+
+    def get(self, token):
+        """
+        The cached user for a verified token, or None. Returns a copy so a
+        request changing its user does not leak into other requests.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                self._discard(token)
+                return None
+            self._entries.move_to_end(token)
+        return copy.copy(user)
+
+    def put(self, token, user, token_expires_at):
+        expires_at = min(token_expires_at, time.time() + token_cache_setting("TTL"))
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (expires_at, copy.copy(user))
+            self._user_tokens.setdefault(user.pk, set()).add(token)
+            while len(self._entries) > token_cache_setting("MAX_SIZE"):
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._user_tokens.get(user_id, ())):
+                self._discard(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_tokens.clear()
+
+    def _discard(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[1].pk
+        tokens = self._user_tokens.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._user_tokens[user_id]
+
+
+token_cache = VerifiedTokenCache()
@@ -2,23 +2,30 @@ from ninja import Body, Router, File, Form
 from ninja.files import UploadedFile
 from django.http import JsonResponse
 from django.contrib.auth.hashers import make_password
+import csv
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from ninja_jwt.exceptions import TokenError
+from ninja_jwt.settings import api_settings
 from ninja_jwt.tokens import RefreshToken
-from ninja_jwt.authentication import AsyncJWTAuth
 from .auth import AuthBearer
+from .blacklist import FilteredRefreshToken
+from .hashing import HashingSaturated, password_executor, verify_password
+from .importer import PatientImporter, detect_format, open_text, patient_import_setting, read_rows
+from .media import profile_thumbnail_url, store_profile_picture
 from notifications.views import send_notification
-from notifications.utils import send_notification_to_user
-from notifications.schemas import NotificationCreate
+from notifications.utils import send_notification_to_user, send_notification_to_role, send_notification_to_users
 from .models import (
     User, DoctorProfile, PatientProfile,
 )
 from .schemas import (
     LoginSchema, SignupSchema, UserOut, DoctorProfileOut, DoctorProfileUpdate, PatientProfileOut, PatientProfileUpdate,
-    CreateemployeeSchema, TokenSchema, ApprovePayload
+    CreateemployeeSchema, TokenSchema, ApprovePayload, BulkApprovePayload
 )
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from django.utils.dateparse import parse_date
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Q
 from ninja import Body
 
@@ -63,49 +70,43 @@ def signup(request, payload: SignupSchema = Form(...), profile_picture: Uploaded
     # Handle profile picture
     if profile_picture:
         try:
-            # Generate unique filename with original extension
-            file_ext = profile_picture.name.split('.')[-1] if '.' in profile_picture.name else ''
-            profile_picture_name = f"profile_pictures/{user.username}_profile.{file_ext}"
-            
-            # Save the file using Django's default storage
-            default_storage.save(profile_picture_name, ContentFile(profile_picture.read()))
-            
-            # Update user's profile picture
-            user.profile_picture = profile_picture_name
-            user.save()
+            store_profile_picture(user, profile_picture)
         except Exception as e:
             return 400, {"error": f"Error saving profile picture: {str(e)}"}
 
     # Notify Record Officers for approval
-    record_officers = get_user_model().objects.filter(role="record_officer").all()
-    for officer in record_officers:
-        # Create the NotificationCreate payload
-        notification_payload = NotificationCreate(
-            recipient_id=officer.id,
-            message=f"New patient registration pending approval: {user.username}"
-        )
-        
-        # Send the notification using the utility function
-        send_notification_to_user(officer, notification_payload.message)
+    send_notification_to_role("record_officer", f"New patient registration pending approval: {user.username}")
 
     return {"message": "Registration successful. Awaiting approval by a record officer."}
 
 # Login
-@router.post("/login/", response={200: dict, 401: dict})
-def user_login(request, payload: LoginSchema):
+@router.post("/login/", response={200: dict, 401: dict, 503: dict})
+async def user_login(request, payload: LoginSchema):
     """
     Login using JWT authentication. Returns access and refresh tokens.
     """
-    user = User.objects.filter(username=payload.username).first()
+    user = await User.objects.filter(username=payload.username).afirst()
+
+    # Hash on the dedicated password executor (see users.hashing)
+    try:
+        is_correct, new_hash = await password_executor.run(
+            verify_password, payload.password, user.password if user else None
+        )
+    except HashingSaturated:
+        return 503, {"error": "Too many logins in progress, please try again shortly."}
 
-    if not user or not user.check_password(payload.password):
+    if not user or not is_correct:
         return 401, {"error": "Invalid credentials"}
 
+    # Hasher or iterations changed since the password was stored
+    if new_hash:
+        await User.objects.filter(pk=user.pk).aupdate(password=new_hash)
+
     if not user.is_active:
         return 401, {"error": "Your account is not approved yet."}
 
-    # Generate Access & Refresh Tokens
-    refresh = RefreshToken.for_user(user)
+    # Generate Access & Refresh Tokens (for_user records the outstanding token)
+    refresh = await sync_to_async(RefreshToken.for_user)(user)
     access = refresh.access_token
 
     # Collect the user's info, including both general and role-specific attributes
@@ -160,25 +161,44 @@ def user_logout(request, token_data: TokenSchema):
 # Refresh Token 
 @router.post("/refresh-token/", response={200: dict, 401: dict})
 async def refresh_token(request):
-    # Get the refresh token from the request body (use request.json())
-    body = await request.json()  # To get the body as a dictionary
-    refresh_token = body.get("refresh")
-    
-    if not refresh_token:
+    """
+    Issue a new access token for the refresh token in the body ({"refresh": ...})
+    or the refresh_token cookie.
+    """
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        body = {}
+    raw_refresh = body.get("refresh") or request.COOKIES.get("refresh_token")
+
+    if not raw_refresh:
         return 401, {"error": "No refresh token provided"}
 
-    # Validate and generate a new access token using the refresh token
     try:
-        # Verify the refresh token (using the method you have for your JWT validation)
-        user = await RefreshToken().verify_refresh_token(refresh_token)
+        # Only tokens the in-memory blacklist filter cannot rule out hit the DB
+        refresh = await sync_to_async(FilteredRefreshToken)(raw_refresh)
+    except TokenError as e:
+        return 401, {"error": "Invalid or expired refresh token", "detail": str(e)}
 
-        # Create a new access token for the user
-        new_access_token = await AsyncJWTAuth().create_token(user)
+    user_id = refresh[api_settings.USER_ID_CLAIM]
+    if not await User.objects.filter(id=user_id, is_active=True).aexists():
+        return 401, {"error": "Invalid or expired refresh token", "detail": "User not found or inactive"}
 
-        return {"message": "Access token refreshed", "access": new_access_token, "refresh": refresh_token}
-    except Exception as e:
-        # Handle invalid or expired refresh token
-        return 401, {"error": "Invalid or expired refresh token", "detail": str(e)}
+    access = refresh.access_token
+    response = JsonResponse({
+        "message": "Access token refreshed",
+        "access": str(access),
+        "refresh": raw_refresh,
+    })
+    response.set_cookie(
+        'access_token',
+        str(access),
+        httponly=False,
+        secure=False,   # Should be True in production (HTTPS)
+        samesite='None',  # Or 'Lax' depending on your use case
+        max_age=60 * 60,
+    )
+    return response
 
 # Manager Creates Employee Accounts 
 @router.post("/create-employee/", response={200: UserOut, 400: dict}, auth=AuthBearer())
@@ -218,32 +238,64 @@ def create_employee(request, payload: CreateemployeeSchema = Form(...), profile_
     # Handle profile picture
     if profile_picture:
         try:
-            # Generate unique filename with original extension
-            file_ext = profile_picture.name.split('.')[-1] if '.' in profile_picture.name else ''
-            profile_picture_name = f"profile_pictures/{user.username}_profile.{file_ext}"
-            
-            # Save the file using Django's default storage
-            default_storage.save(profile_picture_name, ContentFile(profile_picture.read()))
-            
-            # Update user's profile picture
-            user.profile_picture = profile_picture_name
-            user.save()
+            store_profile_picture(user, profile_picture)
         except Exception as e:
             return 400, {"error": f"Error saving profile picture: {str(e)}"}
         
     return user
 
+# Manager bulk-imports patient registrations (CSV with header or JSONL)
+@router.post("/import-patients/", response={200: dict, 400: dict}, auth=AuthBearer())
+def import_patients(request, file: UploadedFile = File(...), offset: int = 0, pending: bool = False):
+    """
+    Imports in the request, hashing passwords in this process, so uploads
+    are limited to PATIENT_IMPORT's MAX_UPLOAD_BYTES and MAX_UPLOAD_ROWS
+    (rows after the offset); larger files go through the import_patients
+    management command.
+    """
+    if request.auth.role != "manager":
+        return 400, {"error": "Only managers can import patients."}
+
+    too_large = {"error": "File too large to import here, use `manage.py import_patients` instead."}
+    if file.size > patient_import_setting("MAX_UPLOAD_BYTES"):
+        return 400, too_large
+
+    importer = PatientImporter(active=not pending)
+    try:
+        max_rows = patient_import_setting("MAX_UPLOAD_ROWS")
+        rows = list(islice(
+            (row for row in read_rows(open_text(file), detect_format(file.name)) if row[0] > offset),
+            max_rows + 1,
+        ))
+        if len(rows) > max_rows:
+            return 400, too_large
+        report = importer.run(rows, offset=offset)
+    except (UnicodeDecodeError, csv.Error) as e:
+        report = importer.report()
+        report["error"] = f"Could not read file: {e}"
+    return report
+
 # endpoint to list the patients that are about to be reviewwd for approval
-@router.get("/approve-patient", response={200: dict, 404: dict, 500: dict}, auth=AuthBearer())
-def get_inactive_patients(request):
+@router.get("/approve-patient", response={200: dict, 400: dict, 404: dict, 500: dict}, auth=AuthBearer())
+def get_inactive_patients(request, after_id: int = None, limit: int = 50):
+    """
+    One page of the approval queue, oldest registrations first. Pass the
+    returned next_cursor as after_id for the next page.
+    """
+    if not 1 <= limit <= 500:
+        return 400, {"error": "limit must be between 1 and 500"}
+
     try:
         # Query inactive users with role='patient'
-        patients = User.objects.filter(role="patient", is_active=False).prefetch_related("patient_profile")
+        patients = User.objects.filter(role="patient", is_active=False).select_related("patient_profile").order_by("id")
+        if after_id is not None:
+            patients = patients.filter(id__gt=after_id)
+        patients = list(patients[:limit])
 
         patient_data = []
         for patient in patients:
             profile = getattr(patient, "patient_profile", None)  # Avoid errors if profile is missing
-            profile_picture_url = request.build_absolute_uri(patient.profile_picture.url) if patient.profile_picture else None
+            profile_picture_url = profile_thumbnail_url(request, patient)
 
             patient_data.append({
                 "user_id": patient.id,
@@ -263,7 +315,8 @@ def get_inactive_patients(request):
                 "profile_picture_url": profile_picture_url,
             })
 
-        return 200, {"patients": patient_data}
+        next_cursor = patients[-1].id if len(patients) == limit else None
+        return 200, {"patients": patient_data, "next_cursor": next_cursor}
 
     except Exception as e:
         return 500, {"error": str(e)}
@@ -282,7 +335,7 @@ def approve_patient(request, payload: ApprovePayload = Body(...)):
         return 400, {"error": "Patient not found or already approved."}
 
     patient.is_active = True
-    patient.save()
+    patient.save(update_fields=["is_active"])
 
     send_notification_to_user(
         recipient=patient,
@@ -291,6 +344,33 @@ def approve_patient(request, payload: ApprovePayload = Body(...)):
 
     return {"message": "Patient approved successfully."}
 
+# Record Officer Approves or Rejects Many Patient Signups at Once
+@router.put("/approve-patients/", response={200: dict, 400: dict}, auth=AuthBearer())
+def bulk_approve_patients(request, payload: BulkApprovePayload = Body(...)):
+    """
+    Approve (activate) or reject (delete) pending registrations in bulk.
+    Ids that are not pending patients are returned in "skipped".
+    """
+    if request.auth.role != "record_officer":
+        return 400, {"error": "Only record officers can approve patients."}
+
+    pending = User.objects.filter(id__in=payload.user_ids, role="patient", is_active=False)
+
+    with transaction.atomic():
+        ids = list(pending.select_for_update().values_list("id", flat=True))
+        if payload.action == "approve":
+            User.objects.filter(id__in=ids).update(is_active=True)
+            send_notification_to_users(ids, "Your registration has been approved. You can now log in.")
+        else:
+            User.objects.filter(id__in=ids).delete()
+
+    found = set(ids)
+    return {
+        "message": f"{len(ids)} patients {'approved' if payload.action == 'approve' else 'rejected'}.",
+        "processed": ids,
+        "skipped": [user_id for user_id in payload.user_ids if user_id not in found],
+    }
+
 # Profile Handling
 ROLE_TO_PROFILE_MAP = {
     'doctor': (DoctorProfile, DoctorProfileOut, DoctorProfileUpdate),